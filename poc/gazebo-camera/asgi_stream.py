@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+asyncio (ASGI) serving mode for the web viewers.
+
+The Flask development server holds one OS thread per open MJPEG connection.
+This module serves the same pages from a single event loop instead, so
+hundreds of viewers cost one coroutine each and the thread count stays
+flat.
+
+Frames still arrive on gz-transport's callback thread. CameraStream calls
+AsyncCameraFeed's listener there, which hands the wake-up to the loop with
+call_soon_threadsafe. Each frame is encoded once per variant (see
+camera_stream.StreamClient), on an executor thread, and every client that
+is waiting for that frame and variant gets the shared bytes. A client's
+send is timed like in the Flask viewers, so a backed-up connection is
+stepped down to a cheaper variant.
+
+Run with an ASGI server, e.g.:
+
+    uvicorn.run(make_app(...), host="0.0.0.0", port=8081)
+"""
+
+import asyncio
+import json
+import time
+from urllib.parse import parse_qsl
+
+from camera_stream import StreamClient
+
+MJPEG_HEADERS = [
+    (b"content-type", b"multipart/x-mixed-replace; boundary=frame"),
+    (b"cache-control", b"no-cache"),
+]
+
+
+class AsyncCameraFeed:
+    """A CameraStream's frames as awaitables on one event loop."""
+
+    def __init__(self, stream, loop: asyncio.AbstractEventLoop):
+        self.stream = stream
+        self.loop = loop
+        self.changed = asyncio.Event()
+        self.encoding = {}  # variant -> (seq, future for that frame's encode)
+        stream.listeners.append(self._on_frame)
+
+    def _on_frame(self):
+        # gz-transport thread
+        self.loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        # Waiters hold the old event; a fresh one is used for the next frame
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    async def next_jpeg(self, after: int, variant: tuple | None = None) -> tuple[int, bytes | None]:
+        """
+        Wait for a frame newer than sequence number `after` and return (seq, jpeg).
+
+        jpeg is None if the frame couldn't be encoded; seq still moves past
+        it, so the next call waits for a newer frame instead of retrying.
+        """
+        while self.stream.seq <= after:
+            await self.changed.wait()
+
+        seq = self.stream.seq
+        encoding_seq, encoding = self.encoding.get(variant, (0, None))
+        if encoding is None or encoding_seq < seq:
+            encoding = self.loop.run_in_executor(None, self.stream._encode_latest, variant)
+            self.encoding[variant] = (seq, encoding)
+        encoded_seq, jpeg = await asyncio.shield(encoding)
+        return max(encoded_seq, seq), jpeg
+
+    async def latest_jpeg(self, variant: tuple | None = None) -> bytes | None:
+        return await self.loop.run_in_executor(None, self.stream.latest_jpeg, variant)
+
+
+async def send_response(send, status: int, body: bytes, content_type: bytes):
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", content_type)]})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+def make_app(index_html: str, streams: dict, snapshots: dict, stats_reporter):
+    """
+    Build an ASGI app serving the viewer.
+
+    Args:
+        index_html: page served at /
+        streams: path -> CameraStream, served as MJPEG
+        snapshots: path -> CameraStream, served as a single JPEG
+        stats_reporter: StatsReporter whose summary is served at /stats
+    """
+    feeds = {}  # CameraStream name -> AsyncCameraFeed, created on first use
+
+    def feed_for(stream) -> AsyncCameraFeed:
+        if stream.name not in feeds:
+            feeds[stream.name] = AsyncCameraFeed(stream, asyncio.get_running_loop())
+        return feeds[stream.name]
+
+    async def mjpeg(stream, query, send):
+        feed = feed_for(stream)
+        client = StreamClient.from_query(stream, query)
+        await send({"type": "http.response.start", "status": 200, "headers": MJPEG_HEADERS})
+        seq = 0
+        with stream.viewer():
+            while True:
+                await asyncio.sleep(client.next_delay())
+                seq, frame = await feed.next_jpeg(seq, client.variant)
+                if frame is None:
+                    continue  # failed encode; seq is past it, so this waits for the next frame
+                stream.count_sent()
+                start = time.monotonic()
+                await send({"type": "http.response.body", "more_body": True,
+                            "body": b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + frame + b'\r\n'})
+                client.sent(time.monotonic() - start)
+
+    async def app(scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] != "http":
+            return
+
+        path = scope["path"]
+        query = dict(parse_qsl(scope.get("query_string", b"").decode()))
+        if path == "/":
+            await send_response(send, 200, index_html.encode(), b"text/html; charset=utf-8")
+        elif path == "/stats":
+            await send_response(send, 200, json.dumps(stats_reporter.summary()).encode(),
+                                b"application/json")
+        elif path in snapshots:
+            stream = snapshots[path]
+            frame = await feed_for(stream).latest_jpeg(StreamClient.from_query(stream, query).variant)
+            if frame is None:
+                await send_response(send, 503, b"No frame available", b"text/plain")
+            else:
+                await send_response(send, 200, frame, b"image/jpeg")
+        elif path in streams:
+            # Stream until the client goes away
+            streaming = asyncio.ensure_future(mjpeg(streams[path], query, send))
+            disconnect = asyncio.ensure_future(wait_for_disconnect(receive))
+            done, pending = await asyncio.wait({streaming, disconnect},
+                                               return_when=asyncio.FIRST_COMPLETED)
+            for task in pending:
+                task.cancel()
+            for task in done:
+                task.result()
+        else:
+            await send_response(send, 404, b"Not found", b"text/plain")
+
+    return app
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+JPEG Encoder Microbenchmark
+
+Encodes the same synthetic frame repeatedly with every installed
+jpeg_encoder backend, at the inspection and overview camera resolutions
+(from worlds/cylinder_inspection.sdf), and reports:
+
+  - encodes per second and milliseconds per encode
+  - Python-heap bytes allocated per frame (peak, via tracemalloc), i.e. the
+    copies made around the encoder; the encoders' own C buffers are not
+    counted
+  - output size, to check the backends are compressing comparably
+
+Usage:
+    python3 bench_jpeg.py
+    python3 bench_jpeg.py --frames 500 --quality 80 --encoder pillow
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+import jpeg_encoder
+
+RESOLUTIONS = {
+    "inspection": (640, 480),
+    "overview": (800, 600),
+}
+FRAMES = 200
+WARMUP = 10
+
+
+def synthetic_frame(width: int, height: int) -> bytes:
+    """A packed RGB frame with smooth gradients and some sensor-like noise."""
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:height, 0:width]
+    frame = np.stack([x * 255 // width, y * 255 // height, (x + y) * 255 // (width + height)], axis=-1)
+    frame = frame + rng.integers(-8, 8, frame.shape)
+    return np.clip(frame, 0, 255).astype(np.uint8).tobytes()
+
+
+def bench(encoder, data: bytes, width: int, height: int, quality: int, frames: int) -> dict:
+    """Time `frames` encodes, then measure allocations over a second pass."""
+    for _ in range(WARMUP):
+        encoder.encode(data, width, height, quality)
+
+    start = time.perf_counter()
+    for _ in range(frames):
+        jpeg = encoder.encode(data, width, height, quality)
+    elapsed = time.perf_counter() - start
+
+    # Separate pass: tracemalloc slows allocation-heavy code down
+    peak = 0
+    tracemalloc.start()
+    for _ in range(frames):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        encoder.encode(data, width, height, quality)
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+
+    return {
+        "fps": frames / elapsed,
+        "ms": 1000 * elapsed / frames,
+        "alloc_kb": peak / 1024,
+        "jpeg_kb": len(jpeg) / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the JPEG encoder backends")
+    parser.add_argument("--frames", type=int, default=FRAMES,
+                        help=f"Encodes per measurement (default: {FRAMES})")
+    parser.add_argument("--quality", type=int, default=90, help="JPEG quality (default: 90)")
+    parser.add_argument("--encoder", choices=list(jpeg_encoder.ENCODERS),
+                        help="Only benchmark this backend")
+    args = parser.parse_args()
+
+    names = [args.encoder] if args.encoder else [
+        name for name, cls in jpeg_encoder.ENCODERS.items() if cls.available]
+    if not names:
+        print("No JPEG encoder installed (pip install Pillow or simplejpeg)")
+        return
+
+    print(f"{'camera':<12}{'size':>10}  {'encoder':<12}{'enc/s':>8}{'ms':>8}"
+          f"{'alloc KB':>10}{'jpeg KB':>9}")
+    for camera, (width, height) in RESOLUTIONS.items():
+        data = synthetic_frame(width, height)
+        raw_kb = len(data) / 1024
+        for name in names:
+            result = bench(jpeg_encoder.get_encoder(name), data, width, height, args.quality, args.frames)
+            print(f"{camera:<12}{f'{width}x{height}':>10}  {name:<12}{result['fps']:>8.0f}"
+                  f"{result['ms']:>8.2f}{result['alloc_kb']:>10.0f}{result['jpeg_kb']:>9.1f}")
+        print(f"{'':<12}{'':>10}  (raw frame {raw_kb:.0f} KB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Pinhole Camera Projection for Bounding Boxes
+
+Projects world points into a Gazebo camera image with a full intrinsics
+matrix and the sensor's world pose, so bounding boxes are right for any
+camera placement (not only one looking straight down) and for any number
+of objects at once.
+
+Gazebo camera conventions:
+  - The sensor looks along its local +X, with +Y to the left and +Z up.
+  - Image u (right) is sensor -Y, image v (down) is sensor -Z.
+  - fx = fy = width / (2 * tan(horizontal_fov / 2)), principal point at
+    the image centre.
+
+A sensor's world pose is the composition of every <pose> from the world
+down to the <sensor> element (model, then link, then sensor), each relative
+to its parent, with SDF roll/pitch/yaw (R = Rz(yaw) * Ry(pitch) * Rx(roll)).
+
+Cans are upright cylinders. Their box is the extent of both rims projected
+into the image; the rims are sampled as polygons circumscribing the circle,
+so the box always contains the whole can, including the side wall visible
+away from the image centre.
+
+Usage:
+    camera = CameraModel.from_sdf("worlds/cylinder_inspection.sdf", "inspection_cam")
+    boxes = camera.cylinder_boxes(centers, radius=0.033, height=0.12)
+
+Run this file to check the projection against known geometries:
+    python3 camera_projection.py
+"""
+
+import math
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+import numpy as np
+
+# Points sampled on each cylinder rim
+RIM_SEGMENTS = 16
+
+
+# ============================================================================
+# Poses
+# ============================================================================
+
+def parse_pose(text: str | None) -> tuple[float, ...]:
+    """Parse an SDF <pose> value "x y z roll pitch yaw" (missing -> zeros)."""
+    values = [float(v) for v in (text or "").split()]
+    return tuple(values + [0.0] * (6 - len(values)))[:6]
+
+
+def pose_matrix(x: float, y: float, z: float, roll: float, pitch: float, yaw: float) -> np.ndarray:
+    """4x4 homogeneous transform for an SDF pose."""
+    cr, sr = math.cos(roll), math.sin(roll)
+    cp, sp = math.cos(pitch), math.sin(pitch)
+    cy, sy = math.cos(yaw), math.sin(yaw)
+    transform = np.eye(4)
+    transform[:3, :3] = [
+        [cy * cp, cy * sp * sr - sy * cr, cy * sp * cr + sy * sr],
+        [sy * cp, sy * sp * sr + cy * cr, sy * sp * cr - cy * sr],
+        [-sp, cp * sr, cp * cr],
+    ]
+    transform[:3, 3] = [x, y, z]
+    return transform
+
+
+def element_pose(element: ET.Element) -> np.ndarray:
+    """Transform of an SDF element relative to its parent."""
+    pose = element.find("pose")
+    return pose_matrix(*parse_pose(pose.text if pose is not None else None))
+
+
+def find_sensor(world_path: Path, sensor_name: str) -> tuple[ET.Element, np.ndarray]:
+    """
+    Find a sensor in a world file and compose its world pose.
+
+    Returns:
+        (sensor element, 4x4 world-from-sensor transform)
+    """
+    root = ET.parse(world_path).getroot()
+    for model in root.iter("model"):
+        for link in model.findall("link"):
+            for sensor in link.findall("sensor"):
+                if sensor.get("name") == sensor_name:
+                    world_from_sensor = element_pose(model) @ element_pose(link) @ element_pose(sensor)
+                    return sensor, world_from_sensor
+    raise ValueError(f"No sensor named {sensor_name!r} in {world_path}")
+
+
+# ============================================================================
+# Camera Model
+# ============================================================================
+
+class CameraModel:
+    """Pinhole model of a Gazebo camera sensor at a fixed world pose."""
+
+    def __init__(self, width: int, height: int, hfov: float, world_from_sensor: np.ndarray):
+        self.width = width
+        self.height = height
+        self.hfov = hfov
+        self.world_from_sensor = world_from_sensor
+
+        focal = width / (2 * math.tan(hfov / 2))
+        self.intrinsics = np.array([
+            [focal, 0.0, width / 2],
+            [0.0, focal, height / 2],
+            [0.0, 0.0, 1.0],
+        ])
+
+        # Sensor frame (x forward, y left, z up) -> optical frame
+        # (x right, y down, z forward)
+        optical_from_sensor = np.array([
+            [0.0, -1.0, 0.0, 0.0],
+            [0.0, 0.0, -1.0, 0.0],
+            [1.0, 0.0, 0.0, 0.0],
+            [0.0, 0.0, 0.0, 1.0],
+        ])
+        self.optical_from_world = optical_from_sensor @ np.linalg.inv(world_from_sensor)
+
+    @classmethod
+    def from_sdf(cls, world_path: Path | str, sensor_name: str) -> "CameraModel":
+        """Build the model from a camera sensor's pose and <camera> settings in a world file."""
+        sensor, world_from_sensor = find_sensor(Path(world_path), sensor_name)
+        camera = sensor.find("camera")
+        return cls(
+            width=int(camera.findtext("image/width", "320")),
+            height=int(camera.findtext("image/height", "240")),
+            hfov=float(camera.findtext("horizontal_fov", "1.047")),
+            world_from_sensor=world_from_sensor,
+        )
+
+    @property
+    def position(self) -> np.ndarray:
+        """Sensor position in world coordinates."""
+        return self.world_from_sensor[:3, 3]
+
+    def project(self, points: np.ndarray) -> np.ndarray:
+        """
+        Project world points into the image.
+
+        Args:
+            points: (..., 3) array of world coordinates
+
+        Returns:
+            (..., 2) array of pixel (u, v); NaN for points behind the camera
+        """
+        points = np.asarray(points, dtype=float)
+        optical = points @ self.optical_from_world[:3, :3].T + self.optical_from_world[:3, 3]
+        depth = optical[..., 2:3]
+        pixels = (optical @ self.intrinsics.T)[..., :2] / np.where(depth > 0, depth, np.nan)
+        return pixels
+
+    def boxes(self, points: np.ndarray) -> np.ndarray:
+        """
+        Pixel bounding boxes of point sets, clamped to the image.
+
+        Args:
+            points: (N, M, 3) array, M world points per object
+
+        Returns:
+            (N, 4) array of x_min, y_min, x_max, y_max in pixels
+        """
+        pixels = self.project(points)
+        low = np.nanmin(pixels, axis=1)
+        high = np.nanmax(pixels, axis=1)
+        size = np.array([self.width, self.height])
+        return np.concatenate([np.clip(low, 0, size), np.clip(high, 0, size)], axis=1)
+
+    def cylinder_boxes(self, centers: np.ndarray, radius: float, height: float,
+                       segments: int = RIM_SEGMENTS) -> np.ndarray:
+        """
+        Normalized boxes of upright cylinders.
+
+        Args:
+            centers: (N, 3) array of cylinder centres in world coordinates
+            radius, height: cylinder size in meters
+
+        Returns:
+            (N, 4) array of x_min, y_min, x_max, y_max, normalized to 0-1
+        """
+        boxes = self.boxes(cylinder_points(centers, radius, height, segments))
+        return boxes / [self.width, self.height, self.width, self.height]
+
+
+def cylinder_points(centers: np.ndarray, radius: float, height: float,
+                    segments: int = RIM_SEGMENTS) -> np.ndarray:
+    """
+    Rim points of upright cylinders.
+
+    Each rim is a regular polygon circumscribing the circle, so anything
+    computed from the points contains the whole cylinder.
+
+    Returns:
+        (N, 2 * segments, 3) array
+    """
+    centers = np.asarray(centers, dtype=float).reshape(-1, 3)
+    angles = np.linspace(0, 2 * math.pi, segments, endpoint=False)
+    ring_radius = radius / math.cos(math.pi / segments)
+    ring = np.stack([ring_radius * np.cos(angles), ring_radius * np.sin(angles), np.zeros(segments)], axis=1)
+    rims = np.concatenate([ring + [0, 0, height / 2], ring - [0, 0, height / 2]])
+    return centers[:, None, :] + rims[None, :, :]
+
+
+def box_dicts(boxes: np.ndarray) -> list[dict]:
+    """Normalized (N, 4) boxes as the dicts used in annotations and uploads."""
+    return [
+        {
+            "x_min_normalized": float(x_min),
+            "x_max_normalized": float(x_max),
+            "y_min_normalized": float(y_min),
+            "y_max_normalized": float(y_max),
+        }
+        for x_min, y_min, x_max, y_max in boxes
+    ]
+
+
+# ============================================================================
+# Self-check
+# ============================================================================
+
+def check():
+    """Check the projection against geometry that can be worked out by hand."""
+    down = pose_matrix(0, 0, 1.0, 0, math.pi / 2, 0)
+    camera = CameraModel(640, 480, math.pi / 2, down)  # fx = 320
+
+    # Straight below the camera: the image centre
+    assert np.allclose(camera.project([0, 0, 0]), [320, 240])
+    # 0.5 m toward +Y at 1 m depth: half the width to the left
+    assert np.allclose(camera.project([0, 0.5, 0]), [160, 240])
+    # +X is image up when looking down
+    assert np.allclose(camera.project([0.25, 0, 0]), [320, 160])
+    # Behind the camera
+    assert np.isnan(camera.project([0, 0, 2.0])).all()
+
+    # A flat disk of radius 0.1 at 1 m depth spans 2 * 0.1 * fx, plus the
+    # circumscribing polygon's slack
+    box = camera.boxes(cylinder_points([[0, 0, 0]], 0.1, 0.0))[0]
+    slack = 1 / math.cos(math.pi / RIM_SEGMENTS)
+    assert np.allclose(box, [320 - 32 * slack, 240 - 32 * slack, 320 + 32 * slack, 240 + 32 * slack])
+
+    # The top rim of a can is nearer, so it sets the box under the camera
+    box = camera.boxes(cylinder_points([[0, 0, 0]], 0.1, 0.2))[0]
+    assert np.isclose(box[2] - box[0], 2 * 32 * slack / 0.9)
+
+    # Many objects in one call match one-at-a-time
+    centers = np.random.default_rng(0).uniform(-0.3, 0.3, (100, 3))
+    batch = camera.cylinder_boxes(centers, 0.033, 0.12)
+    single = np.vstack([camera.cylinder_boxes(c[None], 0.033, 0.12) for c in centers])
+    assert np.allclose(batch, single)
+
+    # The inspection camera in cylinder_inspection.sdf: the sensor ends up at
+    # world x = -0.04 (its local -0.04 z offset, pitched 90 degrees)
+    world = Path(__file__).parent / "worlds" / "cylinder_inspection.sdf"
+    if world.exists():
+        inspection = CameraModel.from_sdf(world, "inspection_cam")
+        assert np.allclose(inspection.position, [-0.04, 0, 0.88], atol=1e-4)
+        assert np.allclose(inspection.project([-0.04, 0, 0.6]), [320, 240], atol=0.1)
+
+    print("camera_projection: all checks passed")
+
+
+if __name__ == "__main__":
+    check()
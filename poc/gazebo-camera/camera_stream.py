@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Camera frame handling shared by the web viewers.
+
+The gz-transport callback only keeps a reference to the newest raw RGB
+buffer, numbers it, and wakes waiting clients. JPEG encoding happens on
+demand, at most once per new frame, and only when a stream or snapshot asks
+for it, so a camera nobody is watching costs no encode CPU.
+
+Stream clients block in next_jpeg() until a frame newer than the last one
+they sent exists, and all of them share that frame's single encode. A slow
+client simply gets the newest frame when it comes back, skipping the ones
+it missed, so nothing queues up and no frame is sent twice.
+
+Clients can ask for a smaller or lower-quality stream and a lower frame
+rate (?width=320&quality=50&fps=10). Each distinct (width, quality) variant
+is encoded once per frame and shared like the full-size one. A StreamClient
+also watches how long each frame takes to send; while its connection backs
+up it is stepped down (quality first, then width) and stepped back up once
+sends are fast again.
+
+Encoding goes through jpeg_encoder, which reads the message buffer in place
+with libjpeg-turbo when simplejpeg is installed and falls back to Pillow.
+
+Each CameraStream tracks its CPU time (callback plus encoding) and a
+reporter thread logs it per camera, split into time with and without
+viewers.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+from PIL import Image
+
+import jpeg_encoder
+
+STATS_INTERVAL = 10.0  # seconds between CPU reports
+FRAME_TIMEOUT = 1.0  # longest a stream client waits for a new frame before checking again
+
+# Stream variants
+VARIANT_TTL = 10.0  # drop a variant's cached frame when nobody asked for it this long
+MIN_WIDTH = 160
+WIDTH_STEP = 16  # requested widths are rounded to this
+MIN_QUALITY = 30
+MAX_QUALITY = 95
+QUALITY_STEP = 5  # requested qualities are rounded to this
+
+# Backpressure: a send slower than SLOW_SEND means the client's socket buffer
+# is full. Once slow sends in a row add up to SLOW_TOTAL seconds the client
+# is stepped down; FAST_STREAK fast sends in a row step it back up.
+SLOW_SEND = 0.1
+SLOW_TOTAL = 0.5
+FAST_STREAK = 60
+DOWNGRADE_QUALITY = 15
+
+
+class CameraStream:
+    """Newest frame of one camera topic, JPEG-encoded lazily."""
+
+    def __init__(self, name: str, quality: int = 80):
+        self.name = name
+        self.quality = quality
+        self.lock = threading.Lock()
+        self.new_frame = threading.Condition(self.lock)
+        self.raw = None  # (seq, width, height, data) of the newest frame
+        self.seq = 0
+        self.variants = {}  # (width or None, quality) -> newest encode of that variant
+        self.viewers = 0
+        self.listeners = []  # called (from the gz thread) after each new frame
+
+        # Stats, reset by take_stats()
+        self.frames_in = 0
+        self.encodes = 0
+        self.frames_sent = 0
+        self.cpu = 0.0
+        self.peak_viewers = 0
+
+    def on_image(self, msg):
+        """gz-transport callback: store the raw frame and wake waiting clients."""
+        start = time.thread_time()
+        with self.lock:
+            self.seq += 1
+            self.raw = (self.seq, msg.width, msg.height, msg.data)
+            self.frames_in += 1
+            self.new_frame.notify_all()
+            self.cpu += time.thread_time() - start
+        for listener in self.listeners:
+            listener()
+
+    def latest_jpeg(self, variant: tuple | None = None) -> bytes | None:
+        """JPEG of the newest frame, encoding it if nobody has yet."""
+        return self._encode_latest(variant)[1]
+
+    def next_jpeg(self, after: int, variant: tuple | None = None,
+                  timeout: float = FRAME_TIMEOUT) -> tuple[int, bytes | None]:
+        """
+        Wait for a frame newer than sequence number `after`.
+
+        Args:
+            variant: (width or None for full size, quality), None for the default
+
+        Returns:
+            (seq, jpeg) of the newest frame, (seq, None) if it couldn't be
+            encoded, or (after, None) on timeout
+        """
+        with self.new_frame:
+            if not self.new_frame.wait_for(lambda: self.seq > after, timeout):
+                return after, None
+            self.frames_sent += 1
+        return self._encode_latest(variant)
+
+    def count_sent(self):
+        """Count a frame sent by a client that doesn't use next_jpeg()."""
+        with self.lock:
+            self.frames_sent += 1
+
+    def _variant(self, key: tuple) -> dict:
+        """Cache entry for a variant, creating it (and dropping idle ones) as needed."""
+        now = time.monotonic()
+        with self.lock:
+            entry = self.variants.get(key)
+            if entry is None:
+                for old in [k for k, v in self.variants.items() if now - v["used"] > VARIANT_TTL]:
+                    del self.variants[old]
+                entry = {"lock": threading.Lock(), "seq": 0, "jpeg": None}
+                self.variants[key] = entry
+            entry["used"] = now
+        return entry
+
+    def _encode_latest(self, variant: tuple | None = None) -> tuple[int, bytes | None]:
+        target_width, quality = variant or (None, self.quality)
+        entry = self._variant((target_width, quality))
+
+        # Read the newest frame only once the encoder is ours, so a client
+        # that waited never re-encodes a frame older than the cached one
+        with entry["lock"]:
+            with self.lock:
+                raw = self.raw
+            if raw is None:
+                return 0, None
+
+            seq, width, height, data = raw
+            if entry["seq"] != seq:
+                start = time.thread_time()
+                try:
+                    if target_width and target_width < width:
+                        img = Image.frombuffer("RGB", (width, height), data, "raw", "RGB", 0, 1)
+                        width, height = target_width, round(height * target_width / width)
+                        data = img.resize((width, height), Image.BILINEAR).tobytes()
+                    entry["jpeg"] = jpeg_encoder.encode_rgb(data, width, height, quality)
+                except Exception as e:
+                    print(f"Error processing {self.name} frame: {e}")
+                    entry["jpeg"] = None
+                # Consumed either way: a bad frame is skipped, not retried
+                entry["seq"] = seq
+                with self.lock:
+                    self.encodes += 1
+                    self.cpu += time.thread_time() - start
+            return entry["seq"], entry["jpeg"]
+
+    @contextmanager
+    def viewer(self):
+        """Count a connected stream client for the duration of the block."""
+        with self.lock:
+            self.viewers += 1
+            self.peak_viewers = max(self.peak_viewers, self.viewers)
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.viewers -= 1
+
+    def take_stats(self) -> dict:
+        """Return the stats since the last call and reset them."""
+        with self.lock:
+            stats = {
+                "frames_in": self.frames_in,
+                "encodes": self.encodes,
+                "frames_sent": self.frames_sent,
+                "cpu": self.cpu,
+                "viewers": self.viewers,
+                "peak_viewers": self.peak_viewers,
+            }
+            self.frames_in = 0
+            self.encodes = 0
+            self.frames_sent = 0
+            self.cpu = 0.0
+            self.peak_viewers = self.viewers
+        return stats
+
+
+def clamp_step(value: int, low: int, high: int, step: int) -> int:
+    """Round value to a multiple of step and clamp it to [low, high]."""
+    return max(low, min(high, round(value / step) * step))
+
+
+class StreamClient:
+    """
+    One stream client's variant and frame rate.
+
+    Starts at what the client asked for (query parameters width, quality,
+    fps; full size, the stream's quality and every frame by default) and is
+    stepped down while its sends are slow: quality first, down to
+    MIN_QUALITY, then width halved, down to MIN_WIDTH. It is stepped back
+    up the same way, never past the request.
+    """
+
+    def __init__(self, stream: CameraStream, width: int | None = None,
+                 quality: int | None = None, fps: float | None = None):
+        self.stream = stream
+        native = stream.raw[1] if stream.raw is not None else None
+        if width is not None:
+            width = clamp_step(width, MIN_WIDTH, native or width, WIDTH_STEP)
+            if width == native:
+                width = None
+        if quality is not None:
+            quality = clamp_step(quality, MIN_QUALITY, MAX_QUALITY, QUALITY_STEP)
+        self.requested = (width, quality if quality is not None else stream.quality)
+        self.variant = self.requested
+        self.frame_interval = 1 / fps if fps else 0.0
+        self.last_frame = 0.0
+        self.slow = 0.0  # seconds spent in the current run of slow sends
+        self.fast = 0
+        self.downgrades = 0
+
+    @classmethod
+    def from_query(cls, stream: CameraStream, args) -> "StreamClient":
+        """Build from a mapping of query parameters (bad values are ignored)."""
+        def number(name, kind):
+            try:
+                value = kind(args.get(name))
+                return value if value > 0 else None
+            except (TypeError, ValueError):
+                return None
+        return cls(stream, number("width", int), number("quality", int), number("fps", float))
+
+    def sent(self, seconds: float):
+        """Record how long sending one frame took and adapt the variant."""
+        if seconds > SLOW_SEND:
+            self.slow += seconds
+            self.fast = 0
+            if self.slow >= SLOW_TOTAL:
+                self.slow = 0.0
+                self._step_down()
+        else:
+            self.slow = 0.0
+            self.fast += 1
+            if self.fast >= FAST_STREAK:
+                self.fast = 0
+                self._step_up()
+
+    def next_delay(self) -> float:
+        """Seconds to wait before taking the next frame to keep to the requested fps."""
+        now = time.monotonic()
+        delay = max(0.0, self.last_frame + self.frame_interval - now)
+        self.last_frame = now + delay
+        return delay
+
+    def _step_down(self):
+        width, quality = self.variant
+        if quality > MIN_QUALITY:
+            quality = max(MIN_QUALITY, quality - DOWNGRADE_QUALITY)
+        else:
+            native = self.stream.raw[1] if self.stream.raw is not None else None
+            current = width or native
+            if current is None or current // 2 < MIN_WIDTH:
+                return
+            width = clamp_step(current // 2, MIN_WIDTH, current, WIDTH_STEP)
+        self.variant = (width, quality)
+        self.downgrades += 1
+
+    def _step_up(self):
+        if self.variant == self.requested:
+            return
+        width, quality = self.variant
+        req_width, req_quality = self.requested
+        if width != req_width:
+            native = self.stream.raw[1] if self.stream.raw is not None else width * 2
+            width = width * 2
+            if req_width is None and width >= native:
+                width = None
+            elif req_width is not None:
+                width = min(width, req_width)
+        else:
+            quality = min(req_quality, quality + DOWNGRADE_QUALITY)
+        self.variant = (width, quality)
+
+
+class StatsReporter:
+    """
+    Logs per-camera CPU use every `interval` seconds.
+
+    An interval counts as "watched" if the camera had a viewer at any point
+    during it. Totals for watched and unwatched time are kept so the cost of
+    a viewer can be compared (see summary(), served at /stats).
+    """
+
+    def __init__(self, streams: dict, interval: float = STATS_INTERVAL):
+        self.streams = streams
+        self.interval = interval
+        # name -> {"watched"/"idle": [cpu seconds, wall seconds]}
+        self.totals = {name: {"watched": [0.0, 0.0], "idle": [0.0, 0.0]} for name in streams}
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        last = time.time()
+        while True:
+            time.sleep(self.interval)
+            now = time.time()
+            elapsed, last = now - last, now
+            for name, stream in self.streams.items():
+                stats = stream.take_stats()
+                bucket = "watched" if stats["peak_viewers"] else "idle"
+                self.totals[name][bucket][0] += stats["cpu"]
+                self.totals[name][bucket][1] += elapsed
+                print(f"[stats] {name}: {stats['viewers']} viewers, "
+                      f"{stats['frames_in'] / elapsed:.1f} fps in, "
+                      f"{stats['encodes'] / elapsed:.1f} encodes/s, "
+                      f"{stats['frames_sent'] / elapsed:.1f} frames/s sent, "
+                      f"CPU {100 * stats['cpu'] / elapsed:.1f}%", flush=True)
+
+    def summary(self) -> dict:
+        """Average CPU percent per camera with and without viewers."""
+        return {
+            name: {
+                bucket: {
+                    "cpu_percent": round(100 * cpu / wall, 2) if wall else None,
+                    "seconds": round(wall, 1),
+                }
+                for bucket, (cpu, wall) in buckets.items()
+            }
+            for name, buckets in self.totals.items()
+        }
@@ -8,17 +8,62 @@ Removes cans when they reach the output end.
 
 About 10% of cans are dented (defective).
 
-Uses gz-transport Python bindings for efficient pose updates.
+Uses gz-transport Python bindings for efficient pose updates. By default all
+can poses for a tick are sent in a single set_pose_vector request; if the
+world does not provide that service, it falls back to one set_pose request
+per can. Per-tick timing is logged periodically.
 Includes backoff/recovery logic when Gazebo becomes overloaded.
+
+Spawns and deletes are sent in-process as EntityFactory/Entity requests on
+the same gz-transport node; --gz-cli switches back to forking `gz service`.
+
+Creates and removes run on a small worker pool fed by a bounded queue, so a
+slow create never delays the motion loop. The pool size caps the number of
+in-flight create/remove requests.
+
+With --adaptive, a rate controller measures the round-trip latency of
+set_pose, create, and remove requests and adjusts the spawn interval and
+tick rate (AIMD on the p95 latency): it backs off multiplicatively as soon
+as any p95 exceeds its target and speeds up additively while there is
+headroom. The fixed ERROR_THRESHOLD pause remains as a last resort.
+
+With --motion velocity, cans are spawned with a VelocityControl system whose
+initial linear velocity is the belt speed, so Gazebo advances them itself
+and no pose requests are sent. Python only spawns cans and deletes them once
+their reported pose (from the world's dynamic_pose/info topic) passes
+DELETE_X.
+
+With --pool N, N good and N dented cans are created at startup in a parking
+area below the ground plane. "Spawning" teleports a free pooled can onto the
+belt and "deleting" teleports it back, so steady-state create/remove calls
+drop to zero. If the pool runs dry a new can is created and joins the pool;
+pool hits and misses are reported with the tick stats.
+
+Usage:
+    python3 can_spawner.py                    # batched pose updates (default)
+    python3 can_spawner.py --pose-mode single # one set_pose request per can
+    python3 can_spawner.py --gz-cli           # spawn/delete via `gz service`
+    python3 can_spawner.py --benchmark 50     # compare spawn rates and exit
+    python3 can_spawner.py --workers 8 --spawn-interval 0.25  # throughput test
+    python3 can_spawner.py --adaptive         # find the highest sustainable rate
+    python3 can_spawner.py --motion velocity  # Gazebo moves the cans
+    python3 can_spawner.py --pool 20          # recycle cans instead of create/remove
 """
 
+import argparse
+import json
+import os
+import queue
 import time
 import random
 import subprocess
 import threading
+from collections import deque
+from pathlib import Path
 
 from gz.transport13 import Node
 from gz.msgs10.pose_pb2 import Pose
+from gz.msgs10.pose_v_pb2 import Pose_V
 from gz.msgs10.boolean_pb2 import Boolean
 from gz.msgs10.entity_pb2 import Entity
 from gz.msgs10.entity_factory_pb2 import EntityFactory
@@ -32,12 +77,77 @@ BELT_Z = 0.60  # Z position (slightly above belt to drop)
 DENT_PROBABILITY = 0.1  # 10% chance of dented can
 CHECK_INTERVAL = 0.033  # seconds between position updates (~30Hz, matches camera)
 BELT_SPEED = 0.06  # meters per second (slow, smooth movement)
+CAN_BELT_Z = 0.54  # Z position of a can resting on the belt
+
+# Gazebo services
+WORLD_NAME = "cylinder_inspection"
+CREATE_SERVICE = f"/world/{WORLD_NAME}/create"
+REMOVE_SERVICE = f"/world/{WORLD_NAME}/remove"
+SET_POSE_SERVICE = f"/world/{WORLD_NAME}/set_pose"
+SET_POSE_VECTOR_SERVICE = f"/world/{WORLD_NAME}/set_pose_vector"
+POSE_INFO_TOPIC = f"/world/{WORLD_NAME}/dynamic_pose/info"
+SET_POSE_TIMEOUT_MS = 100  # timeout for a single set_pose request
+SET_POSE_VECTOR_TIMEOUT_MS = 200  # timeout for a batched set_pose_vector request
+BATCH_PROBE_FAILURES = 5  # failed set_pose_vector requests before checking the service exists
+CREATE_TIMEOUT_MS = 2000  # timeout for a create request
+REMOVE_TIMEOUT_MS = 1000  # timeout for a remove request
+
+# Spawn/delete through `gz service` subprocesses instead of in-process requests
+USE_GZ_CLI = False
+
+# Motion mode: "pose" moves cans with pose requests every tick, "velocity"
+# gives each can a constant velocity at spawn time and lets Gazebo move it
+MOTION_MODE = "pose"
+MODEL_PATHS = os.environ.get("GZ_SIM_RESOURCE_PATH", "/opt/models").split(":") + [
+    str(Path(__file__).parent / "models")
+]
+VELOCITY_PLUGIN = (
+    '<plugin filename="gz-sim-velocity-control-system" '
+    'name="gz::sim::systems::VelocityControl">'
+    '<initial_linear>{speed} 0 0</initial_linear>'
+    '</plugin>'
+)
+
+# Can pool (--pool): parked cans sit in rows below the ground plane, out of
+# sight of every camera
+PARK_X = -2.0  # X position of the first parking slot
+PARK_SPACING = 0.1  # X distance between parking slots
+PARK_Y = {'can_good': 2.0, 'can_dented': 2.2}  # parking row per model type
+PARK_Z = -0.5  # below the ground plane
+
+# Pose update mode: "batch" sends all poses for a tick in one request,
+# "single" sends one request per can
+POSE_MODE = "batch"
+STATS_INTERVAL = 10.0  # seconds between tick timing reports
 
 # Error tracking for backoff/recovery
 ERROR_THRESHOLD = 5  # consecutive failures before pausing spawns
 MAX_CANS = 20  # maximum cans on belt at once (safety limit)
-
-# Track spawned cans
+WORKER_ERROR_RATE = 0.5  # spawn/delete failure rate that pauses spawns
+WORKER_ERROR_WINDOW = 10.0  # seconds of spawn/delete results used for the rate
+
+# Adaptive rate control (--adaptive)
+LATENCY_TARGETS = {  # p95 round-trip latency (seconds) above which we back off
+    'pose': 0.025,
+    'create': 0.500,
+    'remove': 0.250,
+}
+LATENCY_WINDOW = 5.0  # seconds of latency samples used for the p95
+CONTROL_INTERVAL = 1.0  # seconds between controller adjustments
+MIN_SPAWN_INTERVAL = 0.1  # fastest spawn interval the controller will use
+MAX_SPAWN_INTERVAL = 10.0  # slowest spawn interval the controller will use
+MAX_CHECK_INTERVAL = 0.2  # slowest tick interval the controller will use (5Hz)
+SPAWN_RATE_STEP = 0.05  # additive spawn rate increase per adjustment (cans/s)
+TICK_RATE_STEP = 2.0  # additive tick rate increase per adjustment (Hz)
+BACKOFF_FACTOR = 2.0  # multiplicative interval increase when over target
+
+# Spawn/delete worker pool
+WORKERS = 4  # worker threads = maximum in-flight create/remove requests
+WORK_QUEUE_SIZE = 32  # maximum queued spawn/delete jobs
+
+# Track spawned cans. The registry is copy-on-write: writers build a new dict
+# under `lock` and swap it in, so readers just take a reference to `cans`
+# without locking. No Gazebo request is ever made while `lock` is held.
 cans = {}  # name -> {'dented': bool, 'spawn_time': float, 'y_offset': float}
 can_counter = 0
 lock = threading.Lock()
@@ -45,10 +155,49 @@ lock = threading.Lock()
 # Error tracking (shared between threads)
 consecutive_errors = 0
 spawning_paused = False
+worker_results = deque()  # (time, success) for recent spawn/delete jobs
 error_lock = threading.Lock()
 
+# Current spawn and tick intervals (changed by the rate controller)
+spawn_interval = SPAWN_INTERVAL
+tick_interval = CHECK_INTERVAL
+
+# Recent request latencies: kind -> deque of (time, seconds)
+latencies = {kind: deque() for kind in LATENCY_TARGETS}
+latency_lock = threading.Lock()
+
+# Spawn/delete work queue (created in main) and jobs not yet finished
+work_queue = None
+pending_spawns = 0
+pending_deletes = []  # deletes that did not fit in the queue (can manager only)
+work_lock = threading.Lock()
+
 # gz-transport node (initialized in main)
 node = None
+use_gz_cli = USE_GZ_CLI
+
+# Velocity motion mode: model SDF with the velocity plugin, per model type,
+# and the latest x position Gazebo reported for each can
+motion_mode = MOTION_MODE
+velocity_sdf = {}
+observed_x = {}
+
+# Can pool: free pooled cans per model type, each pooled can's model type and
+# parking slot, and hit/miss counts
+pool_enabled = False
+pool_free = {'can_good': deque(), 'can_dented': deque()}
+pool_slots = {}  # name -> (model_type, x, y)
+pool_next = {'can_good': 0, 'can_dented': 0}  # next pool index per model type, never reused
+pool_stats = {'hits': 0, 'misses': 0}
+pool_lock = threading.Lock()
+
+# Batched pose updates (disabled automatically if set_pose_vector is unavailable)
+batch_poses = True
+batch_ever_succeeded = False
+batch_failures = 0  # failed set_pose_vector requests before the first success
+
+# Per-tick timing metrics (only touched by the can manager thread)
+tick_stats = {'ticks': 0, 'total': 0.0, 'max': 0.0, 'overruns': 0, 'cans': 0}
 
 
 def log(msg):
@@ -67,22 +216,87 @@ def run_gz_command(cmd, timeout=5):
         return False, "", str(e)
 
 
-def spawn_can(name: str, dented: bool, y_offset: float):
-    """Spawn a can at the input end of the conveyor."""
+def request_bool(service: str, request, request_type, timeout_ms: int):
+    """Send a gz-transport request with a Boolean reply and return (success, error)."""
+    try:
+        success, response = node.request(service, request, request_type, Boolean, timeout_ms)
+        if success and response.data:
+            return True, ""
+        return False, "Timeout" if not success else "Rejected"
+    except Exception as e:
+        return False, str(e)
+
+
+def load_velocity_sdf(model_type: str) -> str:
+    """Return the model SDF with a VelocityControl plugin moving it at belt speed."""
+    if model_type not in velocity_sdf:
+        for base in MODEL_PATHS:
+            path = Path(base) / model_type / "model.sdf"
+            if path.exists():
+                break
+        else:
+            raise FileNotFoundError(f"model.sdf for {model_type} not found in {MODEL_PATHS}")
+
+        sdf = path.read_text()
+        plugin = VELOCITY_PLUGIN.format(speed=BELT_SPEED)
+        velocity_sdf[model_type] = sdf.replace("</model>", plugin + "\n  </model>", 1)
+    return velocity_sdf[model_type]
+
+
+def on_pose_info(msg: Pose_V):
+    """Track the x position Gazebo reports for each can (velocity mode)."""
+    current = cans
+    for pose in msg.pose:
+        if pose.name in current:
+            observed_x[pose.name] = pose.position.x
+
+
+def spawn_can(name: str, dented: bool, y_offset: float, position: tuple = None):
+    """Spawn a can at the input end of the conveyor (or at `position`)."""
     model_type = "can_dented" if dented else "can_good"
+    start = time.time()
+
+    # In velocity mode the can is placed directly on the belt (nothing snaps
+    # it down) and carries its own velocity controller
+    spawn_x, spawn_y = SPAWN_X, BELT_Y + y_offset
+    if motion_mode == "velocity":
+        spawn_z = CAN_BELT_Z
+        source = f'sdf: {json.dumps(load_velocity_sdf(model_type))}'
+    else:
+        spawn_z = BELT_Z
+        source = f'sdf_filename: "model://{model_type}"'
+    if position is not None:
+        spawn_x, spawn_y, spawn_z = position
+
+    if use_gz_cli:
+        req = f'{source}, name: "{name}", pose: {{position: {{x: {spawn_x}, y: {spawn_y}, z: {spawn_z}}}}}'
+
+        cmd = [
+            "gz", "service", "-s", CREATE_SERVICE,
+            "--reqtype", "gz.msgs.EntityFactory",
+            "--reptype", "gz.msgs.Boolean",
+            "--timeout", str(CREATE_TIMEOUT_MS),
+            "--req", req
+        ]
+
+        success, stdout, stderr = run_gz_command(cmd)
+        success = success and "true" in stdout.lower()
+    else:
+        factory = EntityFactory()
+        if motion_mode == "velocity":
+            factory.sdf = load_velocity_sdf(model_type)
+        else:
+            factory.sdf_filename = f"model://{model_type}"
+        factory.name = name
+        factory.pose.position.x = spawn_x
+        factory.pose.position.y = spawn_y
+        factory.pose.position.z = spawn_z
 
-    req = f'sdf_filename: "model://{model_type}", name: "{name}", pose: {{position: {{x: {SPAWN_X}, y: {BELT_Y + y_offset}, z: {BELT_Z}}}}}'
+        success, stderr = request_bool(CREATE_SERVICE, factory, EntityFactory, CREATE_TIMEOUT_MS)
 
-    cmd = [
-        "gz", "service", "-s", "/world/cylinder_inspection/create",
-        "--reqtype", "gz.msgs.EntityFactory",
-        "--reptype", "gz.msgs.Boolean",
-        "--timeout", "2000",
-        "--req", req
-    ]
+    record_latency('create', time.time() - start)
 
-    success, stdout, stderr = run_gz_command(cmd)
-    if success and "true" in stdout.lower():
+    if success:
         log(f"Spawned {name} ({'DENTED' if dented else 'good'})")
         return True
     else:
@@ -92,127 +306,482 @@ def spawn_can(name: str, dented: bool, y_offset: float):
 
 def delete_can(name: str):
     """Delete a can from the simulation."""
-    cmd = [
-        "gz", "service", "-s", "/world/cylinder_inspection/remove",
-        "--reqtype", "gz.msgs.Entity",
-        "--reptype", "gz.msgs.Boolean",
-        "--timeout", "1000",
-        "--req", f'name: "{name}", type: 2'
-    ]
-
-    success, _, _ = run_gz_command(cmd)
+    start = time.time()
+
+    if use_gz_cli:
+        cmd = [
+            "gz", "service", "-s", REMOVE_SERVICE,
+            "--reqtype", "gz.msgs.Entity",
+            "--reptype", "gz.msgs.Boolean",
+            "--timeout", str(REMOVE_TIMEOUT_MS),
+            "--req", f'name: "{name}", type: 2'
+        ]
+
+        success, _, _ = run_gz_command(cmd)
+    else:
+        entity = Entity()
+        entity.name = name
+        entity.type = Entity.MODEL
+
+        success, _ = request_bool(REMOVE_SERVICE, entity, Entity, REMOVE_TIMEOUT_MS)
+
+    record_latency('remove', time.time() - start)
+
     if success:
         log(f"Deleted {name}")
         return True
     return False
 
 
+def record_latency(kind: str, seconds: float):
+    """Record the round-trip latency of a Gazebo request, dropping samples older than LATENCY_WINDOW."""
+    now = time.time()
+    with latency_lock:
+        samples = latencies[kind]
+        samples.append((now, seconds))
+        while now - samples[0][0] > LATENCY_WINDOW:
+            samples.popleft()
+
+
+def latency_p95() -> dict:
+    """Return kind -> p95 latency over LATENCY_WINDOW (None if no samples)."""
+    now = time.time()
+    result = {}
+    with latency_lock:
+        for kind, samples in latencies.items():
+            while samples and now - samples[0][0] > LATENCY_WINDOW:
+                samples.popleft()
+            values = sorted(seconds for _, seconds in samples)
+            result[kind] = values[int(0.95 * (len(values) - 1))] if values else None
+    return result
+
+
+def rate_controller():
+    """Thread that adapts the spawn interval and tick rate to request latency (AIMD)."""
+    global spawn_interval, tick_interval
+
+    last_report = time.time()
+
+    while True:
+        time.sleep(CONTROL_INTERVAL)
+
+        p95 = latency_p95()
+        over = [kind for kind, value in p95.items()
+                if value is not None and value > LATENCY_TARGETS[kind]]
+
+        if over:
+            # Multiplicative decrease: back off before requests start failing
+            previous = (spawn_interval, tick_interval)
+            spawn_interval = min(MAX_SPAWN_INTERVAL, spawn_interval * BACKOFF_FACTOR)
+            tick_interval = min(MAX_CHECK_INTERVAL, tick_interval * BACKOFF_FACTOR)
+            if (spawn_interval, tick_interval) != previous:
+                log(f"Latency over target ({', '.join(over)}) - spawn interval "
+                    f"{spawn_interval:.2f}s, tick {1 / tick_interval:.0f}Hz")
+        else:
+            # Additive increase: speed back up while there is headroom
+            spawn_interval = max(MIN_SPAWN_INTERVAL, 1 / (1 / spawn_interval + SPAWN_RATE_STEP))
+            tick_interval = max(CHECK_INTERVAL, 1 / (1 / tick_interval + TICK_RATE_STEP))
+
+        if time.time() - last_report >= STATS_INTERVAL:
+            summary = ", ".join(f"{kind} {value * 1000:.0f}ms" for kind, value in p95.items()
+                                if value is not None)
+            log(f"Rate: spawn interval {spawn_interval:.2f}s, tick {1 / tick_interval:.0f}Hz "
+                f"(p95 {summary or 'n/a'})")
+            last_report = time.time()
+
+
+def update_paused(now: float):
+    """Pause or resume spawning from the error signals (call with error_lock held)."""
+    global spawning_paused
+
+    # Forget worker results that have aged out of the window
+    while worker_results and now - worker_results[0][0] > WORKER_ERROR_WINDOW:
+        worker_results.popleft()
+
+    worker_errors = sum(1 for _, success in worker_results if not success)
+    error_rate = worker_errors / len(worker_results) if worker_results else 0.0
+    overloaded = (consecutive_errors >= ERROR_THRESHOLD or
+                  (worker_errors >= ERROR_THRESHOLD and error_rate >= WORKER_ERROR_RATE))
+
+    if overloaded and not spawning_paused:
+        spawning_paused = True
+        log(f"Too many errors ({consecutive_errors} consecutive pose, "
+            f"{error_rate * 100:.0f}% spawn/delete) - pausing spawning")
+    elif not overloaded and spawning_paused:
+        spawning_paused = False
+        log("Gazebo recovered - resuming spawning")
+
+
+def record_result(success: bool):
+    """Update the consecutive pose error count and pause/resume spawning."""
+    global consecutive_errors
+
+    with error_lock:
+        if success:
+            # Reset error count on success
+            consecutive_errors = 0
+        else:
+            consecutive_errors += 1
+        update_paused(time.time())
+
+
+def record_worker_result(success: bool):
+    """Record a spawn/delete result for the worker error rate."""
+    with error_lock:
+        now = time.time()
+        worker_results.append((now, success))
+        update_paused(now)
+
+
+def make_pose(pose: Pose, name: str, x: float, y_offset: float):
+    """Fill in a pose message for a can on the belt."""
+    pose.name = name
+    pose.position.x = x
+    pose.position.y = BELT_Y + y_offset
+    pose.position.z = CAN_BELT_Z
+    return pose
+
+
 def set_can_position(name: str, x: float, y_offset: float):
     """Set the can position using gz-transport (much faster than subprocess)."""
-    global node, consecutive_errors, spawning_paused
+    pose = make_pose(Pose(), name, x, y_offset)
+    start = time.time()
+    success, _ = request_bool(SET_POSE_SERVICE, pose, Pose, SET_POSE_TIMEOUT_MS)
+    record_latency('pose', time.time() - start)
+    record_result(success)
+    return success
+
 
-    z = 0.54  # Height on belt
+def service_advertised(service: str) -> bool:
+    """Check whether the world advertises a service (gz service -l)."""
+    success, stdout, _ = run_gz_command(["gz", "service", "-l"])
+    return success and service in stdout.split()
+
+
+def set_can_positions(updates: list):
+    """
+    Set the positions of many cans in a single set_pose_vector request.
+
+    Args:
+        updates: list of (name, x, y_offset) tuples
+
+    Falls back to one set_pose request per can if batching is disabled or the
+    world does not provide set_pose_vector. Until set_pose_vector has worked
+    once, a failed batch is resent per can; after BATCH_PROBE_FAILURES such
+    failures batching is turned off, unless the service is advertised (and
+    was just slow to start).
+    """
+    global batch_poses, batch_ever_succeeded, batch_failures
+
+    if not updates:
+        return True
 
-    # Create pose message
+    if not batch_poses:
+        results = [set_can_position(name, x, y_offset) for name, x, y_offset in updates]
+        return all(results)
+
+    poses = Pose_V()
+    for name, x, y_offset in updates:
+        make_pose(poses.pose.add(), name, x, y_offset)
+
+    start = time.time()
+    success, _ = request_bool(SET_POSE_VECTOR_SERVICE, poses, Pose_V, SET_POSE_VECTOR_TIMEOUT_MS)
+    record_latency('pose', time.time() - start)
+
+    if success:
+        batch_ever_succeeded = True
+    elif not batch_ever_succeeded:
+        # Service has never answered: it may still be starting, or missing
+        batch_failures += 1
+        if batch_failures >= BATCH_PROBE_FAILURES:
+            batch_failures = 0
+            if not service_advertised(SET_POSE_VECTOR_SERVICE):
+                batch_poses = False
+                log(f"{SET_POSE_VECTOR_SERVICE} unavailable - falling back to per-can set_pose")
+        results = [set_can_position(name, x, y_offset) for name, x, y_offset in updates]
+        return all(results)
+
+    record_result(success)
+    return success
+
+
+def record_tick(duration: float, can_count: int):
+    """Accumulate tick timing and log a summary every STATS_INTERVAL seconds."""
+    tick_stats['ticks'] += 1
+    tick_stats['total'] += duration
+    tick_stats['max'] = max(tick_stats['max'], duration)
+    tick_stats['cans'] += can_count
+    if duration > tick_interval:
+        tick_stats['overruns'] += 1
+
+
+def report_ticks():
+    """Log and reset the tick timing summary."""
+    ticks = tick_stats['ticks']
+    if ticks:
+        mode = "velocity" if motion_mode == "velocity" else ("batch" if batch_poses else "single")
+        log(f"Ticks: {ticks} ({mode} mode), "
+            f"avg {tick_stats['total'] / ticks * 1000:.1f}ms, "
+            f"max {tick_stats['max'] * 1000:.1f}ms, "
+            f"overruns {tick_stats['overruns']}, "
+            f"avg cans {tick_stats['cans'] / ticks:.1f}")
+    tick_stats.update(ticks=0, total=0.0, max=0.0, overruns=0, cans=0)
+
+    if pool_enabled:
+        with pool_lock:
+            log(f"Pool: {pool_stats['hits']} hits, {pool_stats['misses']} misses, "
+                f"{len(pool_free['can_good'])} good / {len(pool_free['can_dented'])} dented free")
+
+
+def add_can(name: str, data: dict):
+    """Add a can to the registry (copy-on-write)."""
+    global cans
+
+    with lock:
+        updated = dict(cans)
+        updated[name] = data
+        cans = updated
+
+
+def remove_cans(names: list):
+    """Remove cans from the registry (copy-on-write)."""
+    global cans
+
+    if not names:
+        return
+    names = set(names)
+    with lock:
+        cans = {name: data for name, data in cans.items() if name not in names}
+    for name in names:
+        observed_x.pop(name, None)
+
+
+def teleport_can(name: str, x: float, y: float, z: float):
+    """Move a can to an arbitrary pose with a single set_pose request."""
     pose = Pose()
     pose.name = name
     pose.position.x = x
-    pose.position.y = BELT_Y + y_offset
+    pose.position.y = y
     pose.position.z = z
+    start = time.time()
+    success, _ = request_bool(SET_POSE_SERVICE, pose, Pose, SET_POSE_TIMEOUT_MS)
+    record_latency('pose', time.time() - start)
+    return success
+
+
+def create_pooled_can(model_type: str):
+    """Create a new pooled can in the next free parking slot; returns its name or None."""
+    with pool_lock:
+        # A failed create may still have queued its can, so its name stays taken
+        index = pool_next[model_type]
+        pool_next[model_type] += 1
+        name = f"pool_{model_type[4:]}_{index:03d}"
+        slot = (model_type, PARK_X + index * PARK_SPACING, PARK_Y[model_type])
+        pool_slots[name] = slot
+
+    if spawn_can(name, model_type == "can_dented", 0.0, position=(slot[1], slot[2], PARK_Z)):
+        return name
+    with pool_lock:
+        del pool_slots[name]
+    return None
+
+
+def fill_pool(size: int):
+    """Create `size` parked cans of each model type."""
+    log(f"Filling can pool ({size} good, {size} dented)...")
+    for model_type in pool_free:
+        for _ in range(size):
+            name = create_pooled_can(model_type)
+            if name:
+                with pool_lock:
+                    pool_free[model_type].append(name)
+    log(f"Can pool ready: {len(pool_free['can_good'])} good, "
+        f"{len(pool_free['can_dented'])} dented")
+
+
+def take_from_pool(data: dict):
+    """Put a pooled can on the belt; returns its name or None on failure."""
+    model_type = "can_dented" if data['dented'] else "can_good"
+
+    with pool_lock:
+        name = pool_free[model_type].popleft() if pool_free[model_type] else None
+        pool_stats['hits' if name else 'misses'] += 1
+
+    if name is None:
+        # Pool miss: create a new can; it joins the pool when it leaves the belt
+        name = create_pooled_can(model_type)
+        if name is None:
+            return None
+
+    if teleport_can(name, SPAWN_X, BELT_Y + data['y_offset'], CAN_BELT_Z):
+        log(f"Placed {name} on belt ({'DENTED' if data['dented'] else 'good'})")
+        return name
+
+    with pool_lock:
+        pool_free[model_type].append(name)
+    return None
+
+
+def return_to_pool(name: str):
+    """Park a pooled can again and mark it free."""
+    model_type, x, y = pool_slots[name]
+    success = teleport_can(name, x, y, PARK_Z)
+    if not success:
+        log(f"Failed to park {name}")
+    # Free it either way: the next take teleports it back onto the belt
+    with pool_lock:
+        pool_free[model_type].append(name)
+    return success
+
+
+def worker():
+    """Worker thread that runs queued spawn and delete jobs."""
+    global pending_spawns
 
-    # Call service with correct signature: (service, request, request_type, response_type, timeout)
+    while True:
+        kind, name, data = work_queue.get()
+        success = False
+
+        # A failing job must not take the worker down with it
+        try:
+            if kind == "spawn":
+                if pool_enabled:
+                    name = take_from_pool(data)
+                    success = name is not None
+                else:
+                    success = spawn_can(name, data['dented'], data['y_offset'])
+                if success:
+                    data['spawn_time'] = time.time()
+                    add_can(name, data)
+            elif name in pool_slots:
+                success = return_to_pool(name)
+            else:
+                success = delete_can(name)
+        except Exception as e:
+            log(f"Worker {kind} of {name} failed: {e}")
+            success = False
+        finally:
+            if kind == "spawn":
+                with work_lock:
+                    pending_spawns -= 1
+            record_worker_result(success)
+            work_queue.task_done()
+
+
+def queue_spawn(name: str, data: dict):
+    """Queue a spawn job; returns False if the queue is full."""
+    global pending_spawns
+
+    with work_lock:
+        pending_spawns += 1
     try:
-        success, response = node.request(
-            "/world/cylinder_inspection/set_pose",
-            pose,
-            Pose,
-            Boolean,
-            100  # timeout in ms
-        )
+        work_queue.put_nowait(("spawn", name, data))
+        return True
+    except queue.Full:
+        with work_lock:
+            pending_spawns -= 1
+        return False
 
-        with error_lock:
-            if success:
-                # Reset error count on success
-                if consecutive_errors > 0:
-                    consecutive_errors = 0
-                    if spawning_paused:
-                        spawning_paused = False
-                        log("Gazebo recovered - resuming spawning")
-            else:
-                consecutive_errors += 1
-                if consecutive_errors >= ERROR_THRESHOLD and not spawning_paused:
-                    spawning_paused = True
-                    log(f"Too many errors ({consecutive_errors}) - pausing spawning")
 
-        return success
-    except Exception as e:
-        with error_lock:
-            consecutive_errors += 1
-            if consecutive_errors >= ERROR_THRESHOLD and not spawning_paused:
-                spawning_paused = True
-                log(f"Too many errors ({consecutive_errors}) - pausing spawning")
-        return False
+def queue_deletes(names: list):
+    """Queue delete jobs, keeping any that don't fit for the next tick."""
+    global pending_deletes
+
+    backlog = pending_deletes + list(names)
+    pending_deletes = []
+    for i, name in enumerate(backlog):
+        try:
+            work_queue.put_nowait(("delete", name, None))
+        except queue.Full:
+            pending_deletes = backlog[i:]
+            break
 
 
 def can_manager():
     """Thread that manages cans - moves them along belt and removes old ones."""
-    global cans
-
     # Stale can timeout (if a can is tracked for way too long, remove it)
     STALE_TIMEOUT = 120.0  # 2 minutes max
 
+    last_report = time.time()
+    next_tick = time.time()
+
     while True:
         current_time = time.time()
 
-        with lock:
-            to_delete = []
-
-            for name, data in list(cans.items()):
-                elapsed_since_spawn = current_time - data['spawn_time']
-
-                # Safety: remove stale cans from tracking (even if delete fails)
-                if elapsed_since_spawn > STALE_TIMEOUT:
-                    log(f"Removing stale can {name} from tracking")
-                    to_delete.append(name)
-                    continue
-
-                # Calculate position based on time since spawn (absolute, not incremental)
-                x_pos = SPAWN_X + (BELT_SPEED * elapsed_since_spawn)
-                set_can_position(name, x_pos, data['y_offset'])
-
-                # Check if reached end
-                if x_pos > DELETE_X:
-                    to_delete.append(name)
-
-            # Delete cans that reached the end
-            for name in to_delete:
-                delete_can(name)  # Try to delete from Gazebo
-                del cans[name]   # Always remove from tracking
-
-        time.sleep(CHECK_INTERVAL)
+        # Lock-free snapshot of the registry for this tick
+        snapshot = cans
+        to_delete = []
+        updates = []
+
+        for name, data in snapshot.items():
+            elapsed_since_spawn = current_time - data['spawn_time']
+
+            # Safety: remove stale cans from tracking (even if delete fails)
+            if elapsed_since_spawn > STALE_TIMEOUT:
+                log(f"Removing stale can {name} from tracking")
+                to_delete.append(name)
+                continue
+
+            # Calculate position based on time since spawn (absolute, not incremental).
+            # In velocity mode Gazebo moves the can; use its reported position
+            # when we have one.
+            x_pos = SPAWN_X + (BELT_SPEED * elapsed_since_spawn)
+            if motion_mode == "velocity":
+                x_pos = observed_x.get(name, x_pos)
+            updates.append((name, x_pos, data['y_offset']))
+
+            # Check if reached end
+            if x_pos > DELETE_X:
+                to_delete.append(name)
+
+        # Send all poses for this tick
+        if motion_mode == "pose":
+            set_can_positions(updates)
+
+        # Always remove from tracking first, then hand the Gazebo deletes to
+        # the worker pool (never blocking the motion loop)
+        remove_cans(to_delete)
+        queue_deletes(to_delete)
+
+        record_tick(time.time() - current_time, len(updates))
+        if current_time - last_report >= STATS_INTERVAL:
+            report_ticks()
+            last_report = current_time
+
+        # Sleep until the next tick boundary so the update rate stays steady;
+        # if we fell behind, start the next tick immediately
+        next_tick += tick_interval
+        delay = next_tick - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            next_tick = time.time()
 
 
 def spawner():
-    """Thread that spawns new cans periodically."""
-    global can_counter, cans, spawning_paused
+    """Thread that queues new cans periodically."""
+    global can_counter
 
     while True:
         # Check if spawning is paused due to errors
         with error_lock:
+            update_paused(time.time())
             paused = spawning_paused
 
-        # Check if we've hit the max can limit
-        with lock:
-            can_count = len(cans)
+        # Check if we've hit the max can limit (lock-free read), counting
+        # spawns still in flight
+        with work_lock:
+            in_flight = pending_spawns
+        can_count = len(cans) + in_flight
 
         if paused:
             # Still paused - wait and check again
-            time.sleep(SPAWN_INTERVAL)
+            time.sleep(spawn_interval)
             continue
 
         if can_count >= MAX_CANS:
             # Too many cans on belt - wait for some to clear
-            time.sleep(SPAWN_INTERVAL)
+            time.sleep(spawn_interval)
             continue
 
         # Determine if this can is dented
@@ -225,28 +794,90 @@ def spawner():
         # Random slight Y offset for variety
         y_offset = random.uniform(-0.03, 0.03)
 
-        # Spawn the can
-        if spawn_can(name, dented, y_offset):
-            with lock:
-                cans[name] = {
-                    'dented': dented,
-                    'spawn_time': time.time(),
-                    'y_offset': y_offset
-                }
+        # Hand the spawn to the worker pool; spawn_time is set once it exists
+        if not queue_spawn(name, {'dented': dented, 'spawn_time': None, 'y_offset': y_offset}):
+            log(f"Work queue full - skipping {name}")
+
+        time.sleep(spawn_interval)
+
+
+def benchmark_spawns(count: int):
+    """Compare spawn/delete throughput of in-process requests against the gz CLI."""
+    global use_gz_cli
 
-        time.sleep(SPAWN_INTERVAL)
+    log(f"Benchmarking {count} spawns and deletes per path...")
+    results = {}
+
+    for label, cli in [("in-process", False), ("gz CLI", True)]:
+        use_gz_cli = cli
+        names = [f"bench_can_{label[:2]}_{i:04d}" for i in range(count)]
+
+        start = time.time()
+        spawned = [name for name in names if spawn_can(name, False, 0.0)]
+        spawn_time = time.time() - start
+
+        start = time.time()
+        deleted = sum(1 for name in spawned if delete_can(name))
+        delete_time = time.time() - start
+
+        results[label] = (len(spawned) / spawn_time if spawn_time else 0.0,
+                          deleted / delete_time if delete_time else 0.0)
+
+    log("=" * 50)
+    for label, (spawn_rate, delete_rate) in results.items():
+        log(f"  {label:>10}: {spawn_rate:6.1f} spawns/s, {delete_rate:6.1f} deletes/s")
+    log("=" * 50)
 
 
 def main():
     """Main entry point."""
-    global node
+    global node, batch_poses, use_gz_cli, motion_mode, pool_enabled, work_queue, spawn_interval, MAX_CANS
+
+    parser = argparse.ArgumentParser(description="Spawn and move cans on the conveyor belt")
+    parser.add_argument("--motion", choices=["pose", "velocity"], default=MOTION_MODE,
+                        help=f"Move cans with per-tick pose requests or a Gazebo velocity controller (default: {MOTION_MODE})")
+    parser.add_argument("--pose-mode", choices=["batch", "single"], default=POSE_MODE,
+                        help=f"How can poses are sent each tick (default: {POSE_MODE})")
+    parser.add_argument("--max-cans", type=int, default=MAX_CANS,
+                        help=f"Maximum cans on the belt at once (default: {MAX_CANS})")
+    parser.add_argument("--spawn-interval", type=float, default=SPAWN_INTERVAL,
+                        help=f"Seconds between spawns (default: {SPAWN_INTERVAL})")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help=f"Spawn/delete workers, i.e. maximum in-flight create/remove requests (default: {WORKERS})")
+    parser.add_argument("--queue-size", type=int, default=WORK_QUEUE_SIZE,
+                        help=f"Maximum queued spawn/delete jobs (default: {WORK_QUEUE_SIZE})")
+    parser.add_argument("--pool", type=int, default=0, metavar="N",
+                        help="Pre-spawn N good and N dented cans and recycle them instead of create/remove")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Adapt spawn interval and tick rate to measured Gazebo request latency")
+    parser.add_argument("--gz-cli", action="store_true", default=USE_GZ_CLI,
+                        help="Spawn/delete cans via `gz service` subprocesses instead of in-process requests")
+    parser.add_argument("--benchmark", type=int, metavar="N",
+                        help="Spawn and delete N cans with each path, report rates, and exit")
+    args = parser.parse_args()
+
+    if args.pool and args.motion == "velocity":
+        parser.error("--pool needs --motion pose (parked cans must not keep moving)")
+
+    batch_poses = args.pose_mode == "batch"
+    motion_mode = args.motion
+    pool_enabled = args.pool > 0
+    use_gz_cli = args.gz_cli
+    MAX_CANS = args.max_cans
+    spawn_interval = args.spawn_interval
 
     log("=" * 50)
     log("Can Spawner Starting")
     log("=" * 50)
-    log(f"  Spawn interval: {SPAWN_INTERVAL}s")
+    log(f"  Spawn interval: {spawn_interval}s{' (adaptive)' if args.adaptive else ''}")
     log(f"  Belt speed: {BELT_SPEED} m/s")
     log(f"  Dent probability: {DENT_PROBABILITY * 100}%")
+    log(f"  Motion: {motion_mode}" + (f", pose mode: {args.pose_mode}" if motion_mode == "pose" else ""))
+    log(f"  Max cans: {MAX_CANS}")
+    if pool_enabled:
+        log(f"  Can pool: {args.pool} good + {args.pool} dented")
+    log(f"  Spawn/delete: {'gz CLI' if use_gz_cli else 'in-process'}, "
+        f"{args.workers} workers, queue {args.queue_size}")
     log("=" * 50)
 
     # Wait for Gazebo to be ready
@@ -257,7 +888,26 @@ def main():
     log("Initializing gz-transport...")
     node = Node()
 
-    # Start can manager thread (moves cans and deletes at end)
+    if args.benchmark:
+        benchmark_spawns(args.benchmark)
+        return
+
+    if motion_mode == "velocity":
+        if node.subscribe(Pose_V, POSE_INFO_TOPIC, on_pose_info):
+            log(f"Subscribed to {POSE_INFO_TOPIC}")
+        else:
+            log(f"Failed to subscribe to {POSE_INFO_TOPIC} - deleting by elapsed time")
+
+    if pool_enabled:
+        fill_pool(args.pool)
+
+    # Start spawn/delete workers
+    work_queue = queue.Queue(maxsize=args.queue_size)
+    for _ in range(args.workers):
+        threading.Thread(target=worker, daemon=True).start()
+    log(f"{args.workers} spawn/delete workers started")
+
+    # Start can manager thread (moves cans and queues deletes at end)
     manager_thread = threading.Thread(target=can_manager, daemon=True)
     manager_thread.start()
     log("Can manager started")
@@ -267,6 +917,10 @@ def main():
     spawner_thread.start()
     log("Spawner started")
 
+    if args.adaptive:
+        threading.Thread(target=rate_controller, daemon=True).start()
+        log("Rate controller started")
+
     # Keep main thread alive
     try:
         while True:
@@ -59,6 +59,14 @@ Therefore, the sensor's local Z offset of -0.04 becomes a WORLD X offset:
 
 This is why CAMERA_SENSOR_X = -0.04, not 0!
 
+None of this needs to be done by hand any more: at startup the script reads
+the camera pose, FOV, image size and topic from the world file (--world, and
+the world's name for its services) and the can size
+from models/can_good/model.sdf (scene_geometry.py, cached by file hash), and
+camera_projection.py projects both can rims through the full pinhole model.
+The constants and formulas in sections 3-6 are the fallback when numpy or
+the SDF files are not available.
+
 
 4. COORDINATE MAPPING (IMAGE <-> WORLD)
 ---------------------------------------
@@ -96,14 +104,19 @@ Current values for standard beverage can:
 
 The can TOP is at: CAN_Z + CAN_HEIGHT/2 = 0.54 + 0.06 = 0.60m
 
-If you change can dimensions:
-  1. Update CAN_RADIUS, CAN_HEIGHT, CAN_Z as needed
-  2. Recalculate CAN_TOP_Z = CAN_Z + CAN_HEIGHT/2
-  3. Recalculate CAMERA_DISTANCE = CAMERA_POS_Z - CAN_TOP_Z
-  4. PIXELS_PER_METER will auto-update from VIEW_WIDTH calculation
+CAN_RADIUS and CAN_HEIGHT are read from the can model, taking the outer
+extent of all its cylinder visuals (label band and lids included). Only
+CAN_Z, the spawn height, is set here. Everything derived from these updates
+automatically.
+
+Bounding boxes are the image extent of both can rims (top and bottom
+circles of radius CAN_RADIUS, CAN_HEIGHT apart) projected through the camera
+model, so they fit the whole visible can with no extra margin. The rims are
+sampled as polygons circumscribing the circles (camera_projection.py), so
+the box never cuts into the can.
 
-The bounding box size is: CAN_RADIUS * PIXELS_PER_METER * margin_factor
-Current margin is 1.15 (15% padding around the can).
+Only the fallback formula (no numpy or world file) uses a fixed size:
+CAN_RADIUS * PIXELS_PER_METER * 1.15, a 15% margin around the can top.
 
 
 7. CREDENTIALS SETUP
@@ -149,6 +162,53 @@ Options:
   --no-upload    Capture images locally without uploading to Viam
   --output DIR   Save images to DIR (default: ./training_data)
   --config FILE  Path to config JSON (default: ./capture_config.json)
+  --gz-cli       Spawn/delete cans via `gz service` subprocesses instead of
+                 in-process gz-transport requests (slower fallback)
+  --reuse-cans   Keep one good and one dented can resident and move them with
+                 set_pose between shots instead of spawn/delete per sample
+  --cans-per-frame K
+                 Pack K non-overlapping cans with random classes and poses into
+                 each frame (default: 1). Each image gets one box per can; the
+                 number of frames stays 2 x --samples.
+  --encode-workers N
+                 Threads that JPEG-encode and write frames while the next scene
+                 is being set up (default: 2; 0 encodes inline)
+  --encode-queue N
+                 Maximum frames waiting to be encoded before capture blocks
+                 (default: 8)
+  --upload-concurrency N
+                 Images uploaded in parallel (default: 8)
+  --fake-upload  Upload to a local fake data client instead of Viam (no
+                 credentials needed); useful for testing the upload path
+  --stream       Start uploading each image as soon as it is written, while
+                 capture is still running (total time ~ max(capture, upload))
+  --resume       Continue an interrupted run in the same --output directory:
+                 skip frames already captured, files already uploaded, and
+                 boxes already added (tracked in manifest.jsonl)
+  --no-local-copy
+                 Upload straight from memory and don't write JPEGs to --output
+                 (annotations.json and manifest.jsonl are still written)
+  --spool-mb N   Encoded images held in memory for upload (default: 64). Past
+                 this, --stream capture waits for uploads to catch up; without
+                 --stream, further images are re-read from disk instead (with
+                 --no-local-copy, from a temporary directory that is deleted
+                 as they are uploaded)
+  --shards       Write images into size-bounded tar shards under
+                 --output/shards (WebDataset layout: <key>.jpg + <key>.json
+                 sidecar per sample) with an index.json of byte offsets,
+                 instead of loose JPEG files
+  --shard-mb N   Maximum shard size (default: 256)
+  --start-index N
+                 Number images from N instead of 0 (used by parallel_capture.py
+                 so the outputs of several instances can be merged)
+  --world FILE   World file the simulation is running (default:
+                 /opt/worlds/cylinder_inspection.sdf). Its <world name> sets
+                 the service and clock topic names, and the camera geometry
+                 and image topic are read from it
+  --camera-sensor NAME
+                 Camera <sensor> in the world file (default: inspection_cam)
+
+To capture with several gz-sim instances at once, see parallel_capture.py.
 
 
 9. TROUBLESHOOTING
@@ -177,10 +237,19 @@ import argparse
 import asyncio
 import io
 import json
+import math
 import os
 import random
+import shutil
 import subprocess
+import tarfile
+import tempfile
+import threading
 import time
+import uuid
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
 
@@ -194,13 +263,21 @@ except ImportError:
     VIAM_SDK_AVAILABLE = False
     print("Warning: viam-sdk not installed. Upload will be disabled.")
 
-# PIL for image handling
+# JPEG encoding (simplejpeg if installed, otherwise Pillow)
+import jpeg_encoder
+JPEG_AVAILABLE = jpeg_encoder.encoder is not None
+if not JPEG_AVAILABLE:
+    print("Warning: Pillow not installed. Install with: pip install Pillow")
+
+# Camera projection for bounding boxes (needs numpy)
 try:
-    from PIL import Image
-    PIL_AVAILABLE = True
+    import numpy as np
+    from camera_projection import CameraModel, box_dicts
+    from scene_geometry import load_scene_geometry
+    PROJECTION_AVAILABLE = True
 except ImportError:
-    PIL_AVAILABLE = False
-    print("Warning: Pillow not installed. Install with: pip install Pillow")
+    PROJECTION_AVAILABLE = False
+    print("Warning: numpy not installed. Using the overhead bounding box formula.")
 
 # Gazebo transport imports
 try:
@@ -208,6 +285,11 @@ try:
     from gz.msgs10.image_pb2 import Image as GzImage
     from gz.msgs10.pose_pb2 import Pose
     from gz.msgs10.boolean_pb2 import Boolean
+    from gz.msgs10.clock_pb2 import Clock
+    from gz.msgs10.entity_pb2 import Entity
+    from gz.msgs10.entity_factory_pb2 import EntityFactory
+    from gz.msgs10.empty_pb2 import Empty
+    from gz.msgs10.scene_pb2 import Scene
     GZ_AVAILABLE = True
 except ImportError:
     GZ_AVAILABLE = False
@@ -222,7 +304,19 @@ except ImportError:
 # Model pose: <pose>0 0 0.88 0 1.5708 0</pose> - at (0,0,0.88) pitched 90° around Y
 # Sensor pose within model: <pose>0 0 -0.04 0 0 0</pose> - offset in local Z
 # After 90° pitch, local Z maps to world -X, so sensor is at world X = -0.04
+#
+# The camera and can values below are read from the SDF files at startup
+# (see scene_geometry.py); the literals are only used if that fails.
 CAMERA_TOPIC = "/inspection_camera"
+CAMERA_SENSOR_NAME = "inspection_cam"  # <sensor> name in the world file
+WORLD_FILES = [  # first one found is the default world (--world)
+    Path("/opt/worlds/cylinder_inspection.sdf"),
+    Path(__file__).parent / "worlds" / "cylinder_inspection.sdf",
+]
+CAN_MODEL_FILES = [  # first one found is used for the can size
+    Path("/opt/models/can_good/model.sdf"),
+    Path(__file__).parent / "models" / "can_good" / "model.sdf",
+]
 CAMERA_MODEL_X = 0.0    # Model X position (used for spawning cans)
 CAMERA_MODEL_Y = 0.0    # Model Y position (used for spawning cans)
 CAMERA_SENSOR_X = -0.04 # Actual sensor X position after rotation (for bounding box calc)
@@ -235,20 +329,135 @@ IMAGE_HEIGHT = 480      # Image height in pixels
 # Can parameters
 CAN_RADIUS = 0.033      # Can radius in meters
 CAN_HEIGHT = 0.12       # Can height in meters
-CAN_Z = 0.54            # Z position where cans sit on belt
+CAN_Z = 0.54            # Z position where cans sit on belt (spawn height, not in the SDF)
 
-# Calculated camera intrinsics
-import math
-# Distance from camera to TOP of can (what we see from above)
-# Can is centered at CAN_Z, top is at CAN_Z + CAN_HEIGHT/2
-CAN_TOP_Z = CAN_Z + CAN_HEIGHT / 2  # 0.54 + 0.06 = 0.60
-CAMERA_DISTANCE = CAMERA_POS_Z - CAN_TOP_Z  # 0.88 - 0.60 = 0.28m
-HFOV_HALF = CAMERA_HFOV / 2
-VIEW_WIDTH = 2 * CAMERA_DISTANCE * math.tan(HFOV_HALF)  # Width visible at can level
-VIEW_HEIGHT = VIEW_WIDTH * IMAGE_HEIGHT / IMAGE_WIDTH   # Height visible
-PIXELS_PER_METER = IMAGE_WIDTH / VIEW_WIDTH             # Scale factor
+# Gazebo world (read from the world file's <world name>; names its services and topics)
+WORLD_NAME = "cylinder_inspection"
+CAPTURE_CAN_PREFIX = "capture_can_"
+
+
+def first_existing(paths: list[Path]) -> Path | None:
+    """Return the first of paths that exists, or None."""
+    return next((path for path in paths if path.exists()), None)
+
+
+def read_world_name(world_file: Path) -> str:
+    """The name of the <world> in an SDF file."""
+    world = ET.parse(world_file).getroot().find("world")
+    if world is None or not world.get("name"):
+        raise ValueError(f"No <world name=...> in {world_file}")
+    return world.get("name")
+
+
+def use_world(world_file: Path | None, sensor_name: str = CAMERA_SENSOR_NAME, strict: bool = False):
+    """
+    Point the script at a world file and its camera sensor.
+
+    Sets WORLD_NAME (and the service and topic names built from it) from
+    the file's <world name>, and the camera and can constants from the SDF
+    geometry (see scene_geometry.py). Called at import with the first of
+    WORLD_FILES, and again by main() for --world / --camera-sensor.
+
+    Args:
+        strict: raise if the world can't be read, instead of warning and
+            keeping the built-in values
+
+    Raises:
+        OSError, ValueError, ET.ParseError: with strict, if the world file,
+            its name or the camera sensor can't be read
+    """
+    global WORLD_FILE, WORLD_NAME, CREATE_SERVICE, REMOVE_SERVICE, SET_POSE_SERVICE
+    global SCENE_INFO_SERVICE, CLOCK_TOPIC, SCENE_GEOMETRY, CAMERA_SENSOR_NAME, CAMERA_TOPIC
+    global CAMERA_MODEL_X, CAMERA_MODEL_Y, CAMERA_SENSOR_X, CAMERA_SENSOR_Y, CAMERA_POS_Z
+    global CAMERA_HFOV, IMAGE_WIDTH, IMAGE_HEIGHT, CAN_RADIUS, CAN_HEIGHT
+    global CAN_TOP_Z, CAMERA_DISTANCE, HFOV_HALF, VIEW_WIDTH, VIEW_HEIGHT, PIXELS_PER_METER
+    global _camera_model
+
+    WORLD_FILE = world_file
+    CAMERA_SENSOR_NAME = sensor_name
+    SCENE_GEOMETRY = None
+    _camera_model = None
+    can_model = first_existing(CAN_MODEL_FILES)
+
+    if world_file is not None:
+        try:
+            WORLD_NAME = read_world_name(world_file)
+            if PROJECTION_AVAILABLE and can_model is not None:
+                SCENE_GEOMETRY = load_scene_geometry(world_file, sensor_name, can_model)
+        except (OSError, ValueError, AttributeError, ET.ParseError) as e:
+            if strict:
+                raise
+            print(f"Warning: could not read scene geometry from SDF ({e}). Using built-in values.")
+
+    if SCENE_GEOMETRY is not None:
+        camera = SCENE_GEOMETRY["camera"]
+        CAMERA_MODEL_X, CAMERA_MODEL_Y, _ = camera["model_position"]
+        CAMERA_SENSOR_X, CAMERA_SENSOR_Y, CAMERA_POS_Z = camera["sensor_position"]
+        CAMERA_HFOV = camera["hfov"]
+        IMAGE_WIDTH = camera["width"]
+        IMAGE_HEIGHT = camera["height"]
+        CAMERA_TOPIC = camera["topic"] or CAMERA_TOPIC
+        CAN_RADIUS = SCENE_GEOMETRY["can"]["radius"]
+        CAN_HEIGHT = SCENE_GEOMETRY["can"]["height"]
+
+    # Calculated camera intrinsics
+    # Distance from camera to TOP of can (what we see from above)
+    # Can is centered at CAN_Z, top is at CAN_Z + CAN_HEIGHT/2
+    CAN_TOP_Z = CAN_Z + CAN_HEIGHT / 2  # ~0.54 + 0.06 = 0.60
+    CAMERA_DISTANCE = CAMERA_POS_Z - CAN_TOP_Z  # ~0.88 - 0.60 = 0.28m
+    HFOV_HALF = CAMERA_HFOV / 2
+    VIEW_WIDTH = 2 * CAMERA_DISTANCE * math.tan(HFOV_HALF)  # Width visible at can level
+    VIEW_HEIGHT = VIEW_WIDTH * IMAGE_HEIGHT / IMAGE_WIDTH   # Height visible
+    PIXELS_PER_METER = IMAGE_WIDTH / VIEW_WIDTH             # Scale factor
+
+    # Gazebo services
+    CREATE_SERVICE = f"/world/{WORLD_NAME}/create"
+    REMOVE_SERVICE = f"/world/{WORLD_NAME}/remove"
+    SET_POSE_SERVICE = f"/world/{WORLD_NAME}/set_pose"
+    SCENE_INFO_SERVICE = f"/world/{WORLD_NAME}/scene/info"
+    CLOCK_TOPIC = f"/world/{WORLD_NAME}/clock"
+
+
+_camera_model = None
+use_world(first_existing(WORLD_FILES))
+
+# Resident cans (--reuse-cans) are parked below the ground plane when not
+# under the camera
+PARK_X = 0.0
+PARK_Y = {"PASS": 1.0, "FAIL": 1.2}
+PARK_Z = -0.5
+
+# Spawn/delete through `gz service` subprocesses instead of in-process requests
+USE_GZ_CLI = False
+
+# Multi-can frames: minimum gap between can edges, and attempts to find a
+# non-overlapping layout before settling for fewer cans
+CAN_GAP = 0.01
+LAYOUT_ATTEMPTS = 200
+
+# Capture pipeline: frames are JPEG-encoded and written on worker threads
+ENCODE_WORKERS = 2
+ENCODE_QUEUE_DEPTH = 8
+
+# Upload: parallel uploads and retries with jittered exponential backoff
+UPLOAD_CONCURRENCY = 8
+UPLOAD_RETRIES = 3
+UPLOAD_BACKOFF = 0.5  # seconds; retry n waits up to UPLOAD_BACKOFF * 2**n
+
+# Bounding boxes are attached from a deferred queue once the uploaded file
+# has been indexed: each is retried with exponential backoff until accepted
+BBOX_WORKERS = 16
+BBOX_INITIAL_DELAY = 0.1  # seconds before the first retry
+BBOX_MAX_DELAY = 2.0  # cap on the retry delay
+BBOX_TIMEOUT = 60.0  # give up on an image's boxes after this long
+BBOX_HISTOGRAM = [0.25, 0.5, 1.0, 2.0, 4.0, 8.0]  # latency bucket edges (seconds)
 
 # Output configuration
+MANIFEST_NAME = "manifest.jsonl"  # append-only run progress log in the output dir
+SPOOL_MB = 64  # encoded JPEGs kept in memory for upload instead of re-read from disk
+SHARD_DIR = "shards"  # tar shards and their index.json, inside the output dir
+SHARD_PATTERN = "can-{:06d}.tar"
+SHARD_MB = 256  # start a new shard once the current one would pass this size
 SAMPLES_PER_CLASS = 50
 OUTPUT_DIR = Path(__file__).parent / "training_data"
 CONFIG_FILE = Path(__file__).parent / "capture_config.json"
@@ -306,6 +515,31 @@ def load_config(config_path: Path) -> dict:
 # Bounding Box Calculation
 # ============================================================================
 
+def get_camera_model() -> "CameraModel | None":
+    """Return the inspection camera model from the world file, or None if unavailable."""
+    global _camera_model
+    if _camera_model is None and SCENE_GEOMETRY is not None:
+        camera = SCENE_GEOMETRY["camera"]
+        _camera_model = CameraModel(camera["width"], camera["height"], camera["hfov"],
+                                    np.array(camera["world_from_sensor"]))
+    return _camera_model
+
+
+def calculate_bounding_boxes(positions: list[tuple[float, float]]) -> list[dict]:
+    """
+    Calculate normalized bounding boxes for cans at the given (x, y) positions.
+
+    All cans are projected in one call through the camera model from the
+    world file. Falls back to calculate_bounding_box() per can when numpy or
+    the world file is missing.
+    """
+    camera = get_camera_model()
+    if camera is None:
+        return [calculate_bounding_box(x, y) for x, y in positions]
+    centers = [(x, y, CAN_Z) for x, y in positions]
+    return box_dicts(camera.cylinder_boxes(centers, CAN_RADIUS, CAN_HEIGHT))
+
+
 def calculate_bounding_box(can_x: float, can_y: float) -> dict:
     """
     Calculate normalized bounding box for a can at given position.
@@ -365,6 +599,18 @@ def calculate_bounding_box(can_x: float, can_y: float) -> dict:
 # Gazebo Interaction
 # ============================================================================
 
+_gz_node = None
+use_gz_cli = USE_GZ_CLI
+
+
+def get_gz_node() -> "Node":
+    """Return the shared gz-transport node used for service requests."""
+    global _gz_node
+    if _gz_node is None:
+        _gz_node = Node()
+    return _gz_node
+
+
 def run_gz_command(cmd: list, timeout: int = 5) -> tuple[bool, str, str]:
     """Run a gz command and return (success, stdout, stderr)."""
     try:
@@ -376,22 +622,46 @@ def run_gz_command(cmd: list, timeout: int = 5) -> tuple[bool, str, str]:
         return False, "", str(e)
 
 
-def spawn_can(name: str, dented: bool, x_offset: float = 0.0, y_offset: float = 0.0, rotation: float = 0.0) -> bool:
-    """Spawn a can at the camera position with optional offset."""
+def request_bool(service: str, request, request_type, timeout_ms: int) -> bool:
+    """Send an in-process gz-transport request and return its Boolean result."""
+    try:
+        success, response = get_gz_node().request(service, request, request_type, Boolean, timeout_ms)
+        return success and response.data
+    except Exception:
+        return False
+
+
+def spawn_can(name: str, dented: bool, x_offset: float = 0.0, y_offset: float = 0.0, rotation: float = 0.0,
+              z: float = CAN_Z) -> bool:
+    """Spawn a can at the camera position with optional offset (rotation: yaw in radians)."""
     model_type = "can_dented" if dented else "can_good"
 
     spawn_x = CAMERA_MODEL_X + x_offset
     spawn_y = CAMERA_MODEL_Y + y_offset
+    # Same yaw quaternion as set_can_pose
+    qz = math.sin(rotation / 2)
+    qw = math.cos(rotation / 2)
+
+    if not use_gz_cli:
+        factory = EntityFactory()
+        factory.sdf_filename = f"model://{model_type}"
+        factory.name = name
+        factory.pose.position.x = spawn_x
+        factory.pose.position.y = spawn_y
+        factory.pose.position.z = z
+        factory.pose.orientation.z = qz
+        factory.pose.orientation.w = qw
+        return request_bool(CREATE_SERVICE, factory, EntityFactory, 2000)
 
     req = (
         f'sdf_filename: "model://{model_type}", '
         f'name: "{name}", '
-        f'pose: {{position: {{x: {spawn_x}, y: {spawn_y}, z: {CAN_Z}}}, '
-        f'orientation: {{z: {rotation}}}}}'
+        f'pose: {{position: {{x: {spawn_x}, y: {spawn_y}, z: {z}}}, '
+        f'orientation: {{z: {qz}, w: {qw}}}}}'
     )
 
     cmd = [
-        "gz", "service", "-s", "/world/cylinder_inspection/create",
+        "gz", "service", "-s", CREATE_SERVICE,
         "--reqtype", "gz.msgs.EntityFactory",
         "--reptype", "gz.msgs.Boolean",
         "--timeout", "2000",
@@ -402,10 +672,21 @@ def spawn_can(name: str, dented: bool, x_offset: float = 0.0, y_offset: float =
     return success and "true" in stdout.lower()
 
 
+def remove_entity(name: str, timeout_ms: int) -> bool:
+    """Remove a model by name with an in-process request."""
+    entity = Entity()
+    entity.name = name
+    entity.type = Entity.MODEL
+    return request_bool(REMOVE_SERVICE, entity, Entity, timeout_ms)
+
+
 def delete_can(name: str) -> bool:
     """Delete a can from the simulation."""
+    if not use_gz_cli:
+        return remove_entity(name, 1000)
+
     cmd = [
-        "gz", "service", "-s", "/world/cylinder_inspection/remove",
+        "gz", "service", "-s", REMOVE_SERVICE,
         "--reqtype", "gz.msgs.Entity",
         "--reptype", "gz.msgs.Boolean",
         "--timeout", "1000",
@@ -418,8 +699,11 @@ def delete_can(name: str) -> bool:
 
 def quick_delete(name: str) -> bool:
     """Quick delete with short timeout (for cleanup)."""
+    if not use_gz_cli:
+        return remove_entity(name, 100)
+
     cmd = [
-        "gz", "service", "-s", "/world/cylinder_inspection/remove",
+        "gz", "service", "-s", REMOVE_SERVICE,
         "--reqtype", "gz.msgs.Entity",
         "--reptype", "gz.msgs.Boolean",
         "--timeout", "100",
@@ -432,12 +716,97 @@ def quick_delete(name: str) -> bool:
         return False
 
 
-def cleanup_scene():
-    """Remove any leftover cans from previous captures."""
+def set_can_pose(name: str, x: float, y: float, z: float, yaw: float = 0.0) -> bool:
+    """Move an existing can to a pose (yaw in radians about world Z)."""
+    qz = math.sin(yaw / 2)
+    qw = math.cos(yaw / 2)
+
+    if not use_gz_cli:
+        pose = Pose()
+        pose.name = name
+        pose.position.x = x
+        pose.position.y = y
+        pose.position.z = z
+        pose.orientation.z = qz
+        pose.orientation.w = qw
+        return request_bool(SET_POSE_SERVICE, pose, Pose, 1000)
+
+    cmd = [
+        "gz", "service", "-s", SET_POSE_SERVICE,
+        "--reqtype", "gz.msgs.Pose",
+        "--reptype", "gz.msgs.Boolean",
+        "--timeout", "1000",
+        "--req", f'name: "{name}", position: {{x: {x}, y: {y}, z: {z}}}, '
+                 f'orientation: {{z: {qz}, w: {qw}}}'
+    ]
+
+    success, stdout, _ = run_gz_command(cmd)
+    return success and "true" in stdout.lower()
+
+
+def list_models() -> list[str] | None:
+    """Names of the models in the world, or None if the scene can't be queried."""
+    if not use_gz_cli:
+        try:
+            success, scene = get_gz_node().request(SCENE_INFO_SERVICE, Empty(), Empty, Scene, 2000)
+            return [model.name for model in scene.model] if success else None
+        except Exception:
+            return None
+
+    success, stdout, _ = run_gz_command(["gz", "model", "--list"])
+    if not success:
+        return None
+    return [line.strip()[2:] for line in stdout.splitlines() if line.strip().startswith("- ")]
+
+
+def resident_can_name(class_name: str, index: int = 0) -> str:
+    """Name of a resident can for a class in --reuse-cans mode."""
+    return f"{CAPTURE_CAN_PREFIX}{class_name}_resident_{index}"
+
+
+def frame_can_name(frame: dict, k: int, cans_per_frame: int) -> str:
+    """Name of the k-th can spawned for a planned frame."""
+    return f"{CAPTURE_CAN_PREFIX}{frame['name']}" + (f"_{k}" if cans_per_frame > 1 else "")
+
+
+def spawn_resident_cans(per_class: int = 1) -> bool:
+    """Spawn `per_class` good and dented cans in their parking spots."""
+    for class_name, is_dented in [("PASS", False), ("FAIL", True)]:
+        for index in range(per_class):
+            if not spawn_can(resident_can_name(class_name, index), dented=is_dented,
+                             x_offset=PARK_X + index * 0.1 - CAMERA_MODEL_X,
+                             y_offset=PARK_Y[class_name] - CAMERA_MODEL_Y,
+                             z=PARK_Z):
+                log(f"Failed to spawn resident {class_name} can {index}")
+                return False
+    return True
+
+
+def park_can(class_name: str, index: int = 0) -> bool:
+    """Move a resident can back to its parking spot, out of the camera view."""
+    return set_can_pose(resident_can_name(class_name, index),
+                        PARK_X + index * 0.1, PARK_Y[class_name], PARK_Z)
+
+
+def cleanup_scene(planned_names: list[str] = ()):
+    """
+    Remove any leftover cans from previous captures.
+
+    Every capture_can_* model in the world is removed. If the world's model
+    list can't be read, the resident cans and planned_names (the cans this
+    run would spawn, which is where an interrupted run of it stopped) are
+    removed instead.
+    """
     log("Cleaning up scene...")
-    for class_name in ["PASS", "FAIL"]:
-        for i in range(60):
-            quick_delete(f"capture_can_{class_name}_{i:03d}")
+    models = list_models()
+    if models is not None:
+        names = [name for name in models if name.startswith(CAPTURE_CAN_PREFIX)]
+    else:
+        names = [resident_can_name(class_name, index)
+                 for class_name in ["PASS", "FAIL"] for index in range(10)]
+        names += planned_names
+    for name in names:
+        quick_delete(name)
     for i in range(50):
         quick_delete(f"can_{i:04d}")
     time.sleep(0.5)
@@ -448,173 +817,1080 @@ def cleanup_scene():
 # Image Capture
 # ============================================================================
 
+def stamp_seconds(stamp) -> float:
+    """Convert a gz.msgs.Time to seconds."""
+    return stamp.sec + stamp.nsec * 1e-9
+
+
 class ImageCapture:
-    """Captures images from Gazebo camera topic."""
+    """
+    Captures images from Gazebo camera topic.
+
+    Frames are synchronized to the scene: mark_scene_change() records the
+    sim time (from the world clock) once a spawn/pose change has been
+    acknowledged, and wait_for_image() then blocks on a condition variable
+    until a frame stamped after that time arrives. Frames rendered before
+    the change are counted as stale and dropped.
+    """
 
     def __init__(self):
-        self.node = Node()
+        self.node = get_gz_node()
         self.latest_image = None
-        self.image_received = False
+        self.frame_cond = threading.Condition()
+        self.frame_seq = 0
+        self.sim_time = None  # latest world clock sim time (seconds)
+        self.barrier = None  # frames stamped at or before this are stale
+        self.barrier_seq = None  # frame_seq when the barrier was set
+        self.stale_frames = 0
+        self.frames_waited = 0
+        self.wait_time = 0.0
 
     def _on_image(self, msg: GzImage):
         """Callback for camera images."""
-        self.latest_image = msg
-        self.image_received = True
+        with self.frame_cond:
+            if self.barrier is not None and stamp_seconds(msg.header.stamp) <= self.barrier:
+                self.stale_frames += 1
+                return
+            self.latest_image = msg
+            self.frame_seq += 1
+            self.frame_cond.notify_all()
+
+    def _on_clock(self, msg: Clock):
+        """Callback for the world clock."""
+        self.sim_time = stamp_seconds(msg.sim)
 
     def subscribe(self):
-        """Subscribe to the camera topic."""
+        """Subscribe to the camera topic and the world clock."""
         success = self.node.subscribe(GzImage, CAMERA_TOPIC, self._on_image)
         if not success:
             raise RuntimeError(f"Failed to subscribe to {CAMERA_TOPIC}")
         log(f"Subscribed to {CAMERA_TOPIC}")
 
+        if self.node.subscribe(Clock, CLOCK_TOPIC, self._on_clock):
+            log(f"Subscribed to {CLOCK_TOPIC}")
+        else:
+            log(f"Failed to subscribe to {CLOCK_TOPIC} - falling back to fixed render delay")
+
+    @property
+    def synchronized(self) -> bool:
+        """True once the world clock is known and frames can be synchronized."""
+        return self.sim_time is not None
+
+    def mark_scene_change(self):
+        """Record that the scene changed; only later frames will be accepted."""
+        with self.frame_cond:
+            self.barrier = self.sim_time
+            self.barrier_seq = self.frame_seq
+            self.latest_image = None
+
     def wait_for_image(self, timeout: float = 2.0) -> bytes | None:
-        """Wait for a new image and return it as JPEG bytes."""
-        self.image_received = False
+        """Wait for a new (non-stale) image and return it as JPEG bytes."""
+        image = self.wait_for_frame(timeout)
+        if image is None:
+            return None
+        return self._convert_to_jpeg(image)
+
+    def wait_for_frame(self, timeout: float = 2.0) -> GzImage | None:
+        """Wait for a new (non-stale) image and return the raw message."""
         start = time.time()
 
-        while not self.image_received and (time.time() - start) < timeout:
-            time.sleep(0.05)
+        with self.frame_cond:
+            # Any frame accepted since the scene change counts as new
+            seq = self.frame_seq if self.barrier_seq is None else self.barrier_seq
+            self.barrier_seq = None
+            received = self.frame_cond.wait_for(lambda: self.frame_seq != seq, timeout=timeout)
+            image = self.latest_image
+
+        self.frames_waited += 1
+        self.wait_time += time.time() - start
 
-        if not self.image_received or self.latest_image is None:
+        if not received:
             return None
+        return image
 
-        return self._convert_to_jpeg(self.latest_image)
+    def sync_summary(self) -> str:
+        """One-line summary of frame synchronization metrics."""
+        avg_wait = self.wait_time / self.frames_waited * 1000 if self.frames_waited else 0.0
+        mode = "sim-time synchronized" if self.synchronized else "fixed delay"
+        return (f"Frame sync ({mode}): {self.stale_frames} stale frames dropped, "
+                f"avg wait {avg_wait:.0f}ms over {self.frames_waited} frames")
 
     def _convert_to_jpeg(self, gz_image: GzImage) -> bytes | None:
         """Convert Gazebo image message to JPEG bytes."""
-        if not PIL_AVAILABLE:
+        if not JPEG_AVAILABLE:
             return None
 
         try:
-            width = gz_image.width
-            height = gz_image.height
-            data = gz_image.data
-
-            if len(data) == width * height * 3:
-                img = Image.frombytes('RGB', (width, height), data)
-            elif len(data) == width * height * 4:
-                img = Image.frombytes('RGBA', (width, height), data)
-                img = img.convert('RGB')
-            else:
-                log(f"Unknown image format: {len(data)} bytes for {width}x{height}")
-                return None
-
-            buffer = io.BytesIO()
-            img.save(buffer, format='JPEG', quality=90)
-            return buffer.getvalue()
+            return jpeg_encoder.encode_rgb(gz_image.data, gz_image.width, gz_image.height, quality=90)
 
+        except ValueError as e:
+            log(str(e))
+            return None
         except Exception as e:
             log(f"Image conversion error: {e}")
             return None
 
 
 # ============================================================================
-# Main Capture Function
+# Run Manifest
 # ============================================================================
 
-def capture_images(output_dir: Path, samples_per_class: int) -> list[dict]:
+class Manifest:
     """
-    Capture labeled images from the simulation.
+    Append-only JSON Lines log of run progress (manifest.jsonl).
 
-    Returns:
-        List of dicts with: filepath, label, bbox, x_offset, y_offset
+    One line is appended, and flushed, per event:
+      {"event": "captured", "filename": ..., "objects": [...]}
+      {"event": "uploaded", "filename": ..., "file_id": ...}
+      {"event": "box", "filename": ..., "index": n}
+      {"event": "annotated", "filename": ...}
+
+    On --resume the log is replayed so completed work can be skipped; a
+    torn last line from a crash is ignored. Without --resume the log is
+    started fresh. Safe to call from encode threads and the event loop.
     """
-    if not GZ_AVAILABLE:
-        raise RuntimeError("Gazebo transport not available. Run inside the container.")
 
-    # Create output directory
-    output_dir.mkdir(parents=True, exist_ok=True)
+    def __init__(self, output_dir: Path, resume: bool = False):
+        self.output_dir = output_dir
+        self.path = output_dir / MANIFEST_NAME
+        self.lock = threading.Lock()
+        self.captured = {}  # filename -> record
+        self.file_ids = {}  # filename -> uploaded file_id
+        self.boxes = {}  # filename -> set of object indexes added
+        self.annotated = set()  # filenames with all boxes added
+
+        output_dir.mkdir(parents=True, exist_ok=True)
+        if resume and self.path.exists():
+            self._replay()
+            log(f"Resuming from {self.path}: {len(self.captured)} captured, "
+                f"{len(self.file_ids)} uploaded, {len(self.annotated)} annotated")
+        self.file = open(self.path, 'a' if resume else 'w')
+
+    def _replay(self):
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                self._apply(entry)
+
+        # Recapture images that are neither on disk nor uploaded (deleted,
+        # or held only in memory with --no-local-copy)
+        for filename, record in list(self.captured.items()):
+            if filename not in self.file_ids and not image_exists(record):
+                del self.captured[filename]
+
+    def _apply(self, entry: dict):
+        filename = entry["filename"]
+        event = entry["event"]
+        if event == "captured":
+            record = {"filepath": self.output_dir / filename, "objects": entry["objects"]}
+            if len(entry["objects"]) == 1:
+                record.update(entry["objects"][0])
+            if "shard" in entry:
+                record["shard"] = entry["shard"]
+            self.captured[filename] = record
+            # A (re)captured image has not been uploaded yet
+            self.file_ids.pop(filename, None)
+            self.boxes.pop(filename, None)
+            self.annotated.discard(filename)
+        elif event == "uploaded":
+            self.file_ids[filename] = entry["file_id"]
+        elif event == "box":
+            self.boxes.setdefault(filename, set()).add(entry["index"])
+        elif event == "annotated":
+            self.annotated.add(filename)
+
+    def _append(self, entry: dict):
+        with self.lock:
+            self.file.write(json.dumps(entry) + "\n")
+            self.file.flush()
+            self._apply(entry)
+
+    def record_captured(self, record: dict):
+        entry = {"event": "captured", "filename": record["filepath"].name,
+                 "objects": record["objects"]}
+        if "shard" in record:
+            entry["shard"] = record["shard"]
+        self._append(entry)
+
+    def record_uploaded(self, filename: str, file_id: str):
+        self._append({"event": "uploaded", "filename": filename, "file_id": file_id})
+
+    def record_box(self, filename: str, index: int):
+        self._append({"event": "box", "filename": filename, "index": index})
+
+    def record_annotated(self, filename: str):
+        self._append({"event": "annotated", "filename": filename})
+
+    def records(self) -> list[dict]:
+        """Captured records in filename order."""
+        with self.lock:
+            return [self.captured[name] for name in sorted(self.captured)]
+
+    def close(self):
+        self.file.close()
 
-    # Clean up any leftover cans first
-    cleanup_scene()
 
-    # Initialize image capture
-    capture = ImageCapture()
-    capture.subscribe()
+# ============================================================================
+# Sharded Output
+# ============================================================================
 
-    log("Waiting for camera...")
-    time.sleep(1.0)
+class ShardWriter:
+    """
+    Writes samples into size-bounded, uncompressed tar shards.
 
-    captured_data = []
+    Each sample becomes two members named by its key (the image file stem),
+    WebDataset style: <key>.jpg and a <key>.json sidecar holding its
+    annotations. A shard is closed once the next sample would take it past
+    max_bytes. The byte offset and size of every member are recorded on the
+    capture record as "shard", so the uploader and training loaders can read
+    an image with one seek, without unpacking. close() writes index.json.
 
-    for class_name, is_dented in [("PASS", False), ("FAIL", True)]:
-        log(f"\nCapturing {samples_per_class} {class_name} samples...")
+    Safe to call add() from several encode threads. Without resume, shards
+    from an earlier run are removed; with it, numbering continues after them.
+    """
+
+    def __init__(self, output_dir: Path, max_bytes: int = SHARD_MB * 1024 * 1024,
+                 resume: bool = False):
+        self.output_dir = output_dir
+        self.shard_dir = output_dir / SHARD_DIR
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.tar = None
+        self.name = None
+
+        self.shard_dir.mkdir(parents=True, exist_ok=True)
+        existing = sorted(self.shard_dir.glob(SHARD_PATTERN.replace("{:06d}", "*")))
+        if not resume:
+            for path in existing:
+                path.unlink()
+            existing = []
+        self.index = len(existing)
+
+    def _member(self, name: str, data: bytes) -> tuple[int, int]:
+        """Append one member to the open shard and return (data offset, size)."""
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        header = len(info.tobuf(self.tar.format, self.tar.encoding, self.tar.errors))
+        offset = self.tar.offset + header
+        self.tar.addfile(info, io.BytesIO(data))
+        return offset, len(data)
+
+    def add(self, record: dict, image_data: bytes):
+        """Write a sample and its sidecar, and set record["shard"]."""
+        key = record["filepath"].stem
+        sidecar = json.dumps(annotation_entry(record)).encode()
+
+        with self.lock:
+            # Two 512-byte headers plus padding is under 2 KiB per sample
+            size = len(image_data) + len(sidecar) + 2048
+            if self.tar is not None and self.tar.offset + size > self.max_bytes:
+                self._close_shard()
+            if self.tar is None:
+                self.name = SHARD_PATTERN.format(self.index)
+                self.index += 1
+                self.tar = tarfile.open(self.shard_dir / self.name, "w", format=tarfile.USTAR_FORMAT)
+
+            path = f"{SHARD_DIR}/{self.name}"
+            jpg = self._member(f"{key}.jpg", image_data)
+            sidecar_at = self._member(f"{key}.json", sidecar)
+
+        record["shard"] = {"path": path, "jpg": jpg, "json": sidecar_at}
+
+    def _close_shard(self):
+        self.tar.close()
+        self.tar = None
+
+    def close(self, records: list[dict]):
+        """Finish the last shard and write index.json for records."""
+        with self.lock:
+            if self.tar is not None:
+                self._close_shard()
+        write_shard_index(self.output_dir, records)
+
+
+def write_shard_index(output_dir: Path, records: list[dict]):
+    """Write <output_dir>/shards/index.json for the sharded records."""
+    shards = {}
+    samples = []
+    for record in records:
+        if "shard" not in record:
+            continue
+        shard = record["shard"]
+        shards[shard["path"]] = shards.get(shard["path"], 0) + 1
+        samples.append({"key": record["filepath"].stem, **shard})
+
+    index = {
+        "shards": [
+            {"path": path, "samples": count, "bytes": (output_dir / path).stat().st_size}
+            for path, count in sorted(shards.items())
+        ],
+        "samples": samples,
+    }
+    index_path = output_dir / SHARD_DIR / "index.json"
+    with open(index_path, 'w') as f:
+        json.dump(index, f, indent=2)
+    log(f"Wrote {len(samples)} samples in {len(shards)} shards, index at {index_path}")
 
-        for i in range(samples_per_class):
-            can_name = f"capture_can_{class_name}_{i:03d}"
 
-            # Add position variation (within camera view)
-            x_offset = random.uniform(-0.02, 0.02)
-            y_offset = random.uniform(-0.02, 0.02)
-            rotation = random.uniform(0, 6.28)
+def image_exists(record: dict) -> bool:
+    """Whether a capture record's image is on disk, as a loose file or in a shard."""
+    if "shard" in record:
+        return (record["filepath"].parent / record["shard"]["path"]).exists()
+    return record["filepath"].exists()
 
-            # Spawn can
-            if not spawn_can(can_name, dented=is_dented, x_offset=x_offset, y_offset=y_offset, rotation=rotation):
-                log(f"  Failed to spawn {can_name}, skipping")
-                continue
 
-            # Wait for rendering
-            time.sleep(0.2)
+def read_image(record: dict) -> bytes:
+    """Read a capture record's JPEG from its loose file or shard."""
+    if "shard" not in record:
+        with open(record["filepath"], 'rb') as f:
+            return f.read()
+    offset, size = record["shard"]["jpg"]
+    with open(record["filepath"].parent / record["shard"]["path"], 'rb') as f:
+        f.seek(offset)
+        return f.read(size)
 
-            # Capture image
-            image_data = capture.wait_for_image(timeout=2.0)
 
-            if image_data:
-                # Save locally
-                filename = f"{class_name}_{i:03d}.jpg"
-                filepath = output_dir / filename
+# ============================================================================
+# In-Memory Image Spool
+# ============================================================================
+
+class ImageSpool:
+    """
+    Encoded JPEGs held in memory between capture and upload.
+
+    put() attaches the bytes to the capture record as "image_data" and
+    take() removes them again, so the uploader doesn't re-read the file it
+    just wrote. At most max_bytes are held (None for no limit). When full,
+    put() either blocks until take() frees space (block=True, for --stream,
+    where uploads run alongside capture) or refuses, leaving the uploader to
+    read that image from disk. local_copy=False means frames held here are
+    not written to disk at all; frames that don't fit are spilled to
+    spill_dir (a temporary directory, not the output) and deleted when
+    take() reads them back.
+    """
+
+    def __init__(self, max_bytes: int | None = SPOOL_MB * 1024 * 1024, block: bool = False,
+                 local_copy: bool = True, spill_dir: Path | None = None):
+        self.max_bytes = max_bytes
+        self.block = block
+        self.local_copy = local_copy
+        self.spill_dir = spill_dir
+        self.cond = threading.Condition()
+        self.used = 0
+        self.peak = 0
+        self.held = 0
+        self.spilled = 0
+        self.waits = 0
+
+    def _fits(self, size: int) -> bool:
+        return self.max_bytes is None or self.used == 0 or self.used + size <= self.max_bytes
+
+    def put(self, record: dict, image_data: bytes) -> bool:
+        """Hold image_data for record's upload. Returns False if it must be read from disk."""
+        with self.cond:
+            if not self._fits(len(image_data)):
+                if not self.block:
+                    self.spilled += 1
+                    return False
+                self.waits += 1
+                self.cond.wait_for(lambda: self._fits(len(image_data)))
+            record["image_data"] = image_data
+            self.used += len(image_data)
+            self.peak = max(self.peak, self.used)
+            self.held += 1
+            return True
+
+    def spill(self, record: dict, image_data: bytes):
+        """Write an image that didn't fit to spill_dir until take() reads it."""
+        path = self.spill_dir / record["filepath"].name
+        with open(path, 'wb') as f:
+            f.write(image_data)
+        record["spill_path"] = path
+
+    def take(self, record: dict) -> bytes | None:
+        """Remove and return the bytes held (or spilled) for record, or None if none are."""
+        image_data = record.pop("image_data", None)
+        if image_data is not None:
+            with self.cond:
+                self.used -= len(image_data)
+                self.cond.notify_all()
+        elif "spill_path" in record:
+            path = record.pop("spill_path")
+            image_data = path.read_bytes()
+            path.unlink()
+        return image_data
+
+    def close(self):
+        """Delete the spill directory and anything left in it."""
+        if self.spill_dir is not None:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+    def summary(self) -> str:
+        return (f"Image spool: {self.held} images uploaded from memory, {self.spilled} re-read from disk, "
+                f"peak {self.peak / 1e6:.1f} MB, capture waited {self.waits}x for uploads")
+
+
+# ============================================================================
+# Capture Pipeline
+# ============================================================================
+
+class StageTimer:
+    """Accumulates wall time per capture stage (thread-safe)."""
+
+    def __init__(self):
+        self.totals = {}
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float):
+        with self.lock:
+            self.totals[stage] = self.totals.get(stage, 0.0) + seconds
+            self.counts[stage] = self.counts.get(stage, 0) + 1
+
+    @contextmanager
+    def time(self, stage: str):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add(stage, time.time() - start)
+
+    def summary(self, wall_time: float) -> str:
+        """Multi-line summary of time spent per stage."""
+        lines = [f"Stage timing (wall {wall_time:.1f}s):"]
+        with self.lock:
+            for stage, total in self.totals.items():
+                count = self.counts[stage]
+                lines.append(f"  {stage:<12} {total:7.2f}s total, {total / count * 1000:7.1f}ms avg x {count}")
+        return "\n".join(lines)
+
+
+class CapturePipeline:
+    """
+    Runs frame encode/write jobs on a thread pool so Gazebo can render the
+    next scene meanwhile.
+
+    At most `depth` jobs are queued or running; submit() blocks beyond that
+    (backpressure). With workers=0 jobs run inline on the caller's thread.
+    """
+
+    def __init__(self, timer: StageTimer, workers: int = ENCODE_WORKERS, depth: int = ENCODE_QUEUE_DEPTH):
+        self.timer = timer
+        self.executor = ThreadPoolExecutor(max_workers=workers) if workers > 0 else None
+        self.slots = threading.BoundedSemaphore(max(depth, 1))
+        self.futures = []
+
+    def submit(self, fn, *args):
+        """Queue fn(*args); its return value is collected by finish()."""
+        if self.executor is None:
+            self.futures.append(fn(*args))
+            return
+
+        with self.timer.time("backpressure"):
+            self.slots.acquire()
+        future = self.executor.submit(fn, *args)
+        future.add_done_callback(lambda _: self.slots.release())
+        self.futures.append(future)
+
+    def finish(self) -> list:
+        """Wait for all jobs and return their results in submission order."""
+        if self.executor is None:
+            return self.futures
+        with self.timer.time("drain"):
+            results = [future.result() for future in self.futures]
+        self.executor.shutdown()
+        return results
+
+
+def save_frame(capture: ImageCapture, timer: StageTimer, image: GzImage, filepath: Path,
+               objects: list[dict], on_record=None, manifest: Manifest | None = None,
+               spool: ImageSpool | None = None, shards: ShardWriter | None = None) -> dict | None:
+    """Encode a raw frame to JPEG, write it, and return its capture record.
+
+    The JPEG goes to a shard if shards is given, else to filepath. With a
+    spool the bytes are also kept on the record for upload, and the write is
+    skipped if the spool has no local copy (frames it can't hold are then
+    spilled to its temporary directory instead).
+    on_record, if given, is called with the record as soon as it is saved.
+    """
+    with timer.time("encode"):
+        image_data = capture._convert_to_jpeg(image)
+    if not image_data:
+        log(f"  Failed to encode {filepath.name}")
+        return None
+
+    record = {"filepath": filepath, "objects": objects}
+    if len(objects) == 1:
+        record.update(objects[0])
+
+    held = False
+    if spool is not None:
+        with timer.time("spool"):
+            held = spool.put(record, image_data)
+
+    if not held and spool is not None and not spool.local_copy:
+        with timer.time("write"):
+            spool.spill(record, image_data)
+    elif not held or spool.local_copy:
+        with timer.time("write"):
+            if shards is not None:
+                shards.add(record, image_data)
+            else:
                 with open(filepath, 'wb') as f:
                     f.write(image_data)
+    if manifest is not None:
+        manifest.record_captured(record)
+    if on_record is not None:
+        on_record(record)
+    return record
+
+
+# ============================================================================
+# Main Capture Function
+# ============================================================================
 
-                # Calculate bounding box
-                can_x = CAMERA_MODEL_X + x_offset
-                can_y = CAMERA_MODEL_Y + y_offset
-                bbox = calculate_bounding_box(can_x, can_y)
-
-                captured_data.append({
-                    "filepath": filepath,
-                    "label": class_name,
-                    "bbox": bbox,
-                    "x_offset": x_offset,
-                    "y_offset": y_offset,
+def random_layout(count: int) -> list[tuple[float, float]]:
+    """
+    Pick (x_offset, y_offset) positions for `count` non-overlapping cans.
+
+    A single can gets the original small jitter around the camera. Several
+    cans are spread over the whole view at can height, keeping each can's
+    bounding box inside the image. Returns fewer positions if no layout is
+    found within LAYOUT_ATTEMPTS tries.
+    """
+    if count == 1:
+        return [(random.uniform(-0.02, 0.02), random.uniform(-0.02, 0.02))]
+
+    # Image height runs along world X and image width along world Y
+    margin = CAN_RADIUS * 1.15
+    half_x = VIEW_HEIGHT / 2 - margin
+    half_y = VIEW_WIDTH / 2 - margin
+    min_distance = 2 * CAN_RADIUS + CAN_GAP
+
+    for target in range(count, 0, -1):
+        for _ in range(LAYOUT_ATTEMPTS):
+            positions = []
+            for _ in range(target):
+                x = CAMERA_SENSOR_X + random.uniform(-half_x, half_x)
+                y = CAMERA_SENSOR_Y + random.uniform(-half_y, half_y)
+                if all(math.hypot(x - px, y - py) >= min_distance for px, py in positions):
+                    positions.append((x, y))
+            if len(positions) == target:
+                return [(x - CAMERA_MODEL_X, y - CAMERA_MODEL_Y) for x, y in positions]
+    return []
+
+
+def plan_frames(samples_per_class: int, cans_per_frame: int, start_index: int = 0) -> list[dict]:
+    """
+    Plan every frame of the run.
+
+    Frame numbers start at start_index, so runs that are merged afterwards
+    (parallel_capture.py) don't reuse image names.
+
+    Returns:
+        List of dicts with: name (image file stem) and objects, a list of
+        dicts with label, dented, x_offset, y_offset, rotation
+    """
+    frames = []
+
+    if cans_per_frame == 1:
+        for class_name, is_dented in [("PASS", False), ("FAIL", True)]:
+            for i in range(start_index, start_index + samples_per_class):
+                (x_offset, y_offset), = random_layout(1)
+                frames.append({
+                    "name": f"{class_name}_{i:03d}",
+                    "objects": [{
+                        "label": class_name,
+                        "dented": is_dented,
+                        "x_offset": x_offset,
+                        "y_offset": y_offset,
+                        "rotation": random.uniform(0, 6.28),
+                    }],
                 })
+        return frames
+
+    for i in range(2 * start_index, 2 * (start_index + samples_per_class)):
+        objects = []
+        for x_offset, y_offset in random_layout(cans_per_frame):
+            is_dented = random.random() < 0.5
+            objects.append({
+                "label": "FAIL" if is_dented else "PASS",
+                "dented": is_dented,
+                "x_offset": x_offset,
+                "y_offset": y_offset,
+                "rotation": random.uniform(0, 6.28),
+            })
+        frames.append({"name": f"FRAME_{i:04d}", "objects": objects})
+    return frames
+
+
+def capture_images(output_dir: Path, samples_per_class: int, reuse_cans: bool = False,
+                   cans_per_frame: int = 1, encode_workers: int = ENCODE_WORKERS,
+                   encode_queue: int = ENCODE_QUEUE_DEPTH, on_record=None,
+                   manifest: Manifest | None = None, spool: ImageSpool | None = None,
+                   shards: ShardWriter | None = None, start_index: int = 0) -> list[dict]:
+    """
+    Capture labeled images from the simulation.
 
-                if (i + 1) % 10 == 0:
-                    log(f"  Captured {i + 1}/{samples_per_class}")
-            else:
-                log(f"  Failed to capture image for {can_name}")
+    With reuse_cans, resident good and dented cans stay in the world for the
+    whole run and are moved under the camera with set_pose for each shot,
+    instead of spawning and deleting cans per sample.
+
+    With cans_per_frame > 1, each frame holds that many non-overlapping cans
+    of random classes, and every can gets its own bounding box.
+
+    Raw frames are handed to a CapturePipeline that encodes and writes them
+    on encode_workers threads while the next scene is set up; a per-stage
+    timing summary is logged at the end. If on_record is given it is called
+    (from an encode thread) with each record as soon as its image is saved.
+
+    With a manifest, each saved frame is logged to it, and frames it already
+    lists as captured (on --resume) are skipped. Every record in the
+    manifest is returned, including frames outside this run's plan (e.g.
+    from a larger earlier run or a parallel_capture.py merge). If nothing is
+    left to capture, Gazebo isn't needed at all.
+
+    With a spool, encoded images are also kept in memory for the uploader
+    (see ImageSpool) and may not be written to output_dir at all.
+
+    With shards, images are written into tar shards (see ShardWriter)
+    instead of loose files, and the shard index is written at the end.
+
+    Returns:
+        List of dicts with: filepath, objects (list of label, bbox, x_offset,
+        y_offset), and for single-can frames also label, bbox, x_offset, y_offset
+    """
+    # Create output directory
+    output_dir.mkdir(parents=True, exist_ok=True)
 
-            # Delete can and wait for scene to clear
-            delete_can(can_name)
-            time.sleep(0.5)
+    planned = plan_frames(samples_per_class, cans_per_frame, start_index)
+    frames = planned
+    resumed = []
+    if manifest is not None:
+        resumed = manifest.records()
+        frames = [f for f in planned if f"{f['name']}.jpg" not in manifest.captured]
+        if resumed:
+            log(f"Resuming with {len(resumed)} images already captured")
+    if not frames:
+        log("Nothing left to capture")
+        if shards is not None:
+            shards.close(resumed)
+        write_annotations(output_dir, resumed)
+        return resumed
+
+    if not GZ_AVAILABLE:
+        raise RuntimeError("Gazebo transport not available. Run inside the container.")
+
+    # Clean up any leftover cans first
+    cleanup_scene([frame_can_name(frame, k, cans_per_frame)
+                   for frame in planned for k in range(len(frame["objects"]))])
+
+    # Initialize image capture
+    capture = ImageCapture()
+    capture.subscribe()
+
+    if reuse_cans and not spawn_resident_cans(cans_per_frame):
+        raise RuntimeError("Could not spawn resident cans")
+
+    log("Waiting for camera...")
+    time.sleep(1.0)
 
-    log(f"\nCapture complete: {len([d for d in captured_data if d['label'] == 'PASS'])} PASS, "
-        f"{len([d for d in captured_data if d['label'] == 'FAIL'])} FAIL")
+    timer = StageTimer()
+    pipeline = CapturePipeline(timer, encode_workers, encode_queue)
+    run_start = time.time()
+    in_view = set()  # resident cans (class_name, index) currently under the camera
+    current_group = None
+
+    for i, frame in enumerate(frames):
+        # Progress is reported per class for single-can runs, per run otherwise
+        group = frame["objects"][0]["label"] if cans_per_frame == 1 else "multi-can"
+        if group != current_group:
+            current_group = group
+            group_size = sum(1 for f in frames if cans_per_frame > 1 or f["objects"][0]["label"] == group)
+            group_start = i
+            log(f"\nCapturing {group_size} {group} samples...")
+
+        # Move resident cans under the camera, or spawn new ones
+        used = set()
+        can_names = []
+        placed = True
+        place_start = time.time()
+        for k, obj in enumerate(frame["objects"]):
+            if reuse_cans:
+                index = sum(1 for cls, _ in used if cls == obj["label"])
+                used.add((obj["label"], index))
+                can_name = resident_can_name(obj["label"], index)
+                placed = set_can_pose(can_name, CAMERA_MODEL_X + obj["x_offset"],
+                                      CAMERA_MODEL_Y + obj["y_offset"], CAN_Z, yaw=obj["rotation"])
+            else:
+                can_name = frame_can_name(frame, k, cans_per_frame)
+                placed = spawn_can(can_name, dented=obj["dented"], x_offset=obj["x_offset"],
+                                   y_offset=obj["y_offset"], rotation=obj["rotation"])
+            if not placed:
+                log(f"  Failed to place {can_name}, skipping")
+                break
+            can_names.append(can_name)
+
+        # Park resident cans left in view by the previous frame
+        if reuse_cans:
+            for class_name, index in in_view - used:
+                park_can(class_name, index)
+            in_view = used
+        timer.add("place", time.time() - place_start)
+
+        if placed:
+            # Only accept frames rendered after the change was acknowledged;
+            # without the world clock, fall back to a fixed render delay
+            with timer.time("render"):
+                if capture.synchronized:
+                    capture.mark_scene_change()
+                else:
+                    time.sleep(0.2)
+
+                # Capture raw frame
+                image = capture.wait_for_frame(timeout=2.0)
+
+            if image is not None:
+                filepath = output_dir / f"{frame['name']}.jpg"
+
+                # Calculate bounding boxes
+                boxes = calculate_bounding_boxes([
+                    (CAMERA_MODEL_X + obj["x_offset"], CAMERA_MODEL_Y + obj["y_offset"])
+                    for obj in frame["objects"]
+                ])
+                objects = [
+                    {
+                        "label": obj["label"],
+                        "bbox": bbox,
+                        "x_offset": obj["x_offset"],
+                        "y_offset": obj["y_offset"],
+                    }
+                    for obj, bbox in zip(frame["objects"], boxes)
+                ]
+
+                # Encode and save off the capture thread
+                pipeline.submit(save_frame, capture, timer, image, filepath, objects, on_record, manifest,
+                                spool, shards)
+
+                done = i - group_start + 1
+                if done % 10 == 0:
+                    log(f"  Captured {done}/{group_size}")
+            else:
+                log(f"  Failed to capture image for {frame['name']}")
+
+        # Delete cans and wait for scene to clear (resident cans just
+        # get moved again for the next shot)
+        if not reuse_cans:
+            with timer.time("clear"):
+                for can_name in can_names:
+                    delete_can(can_name)
+                time.sleep(0.5)
+
+    captured_data = resumed + [record for record in pipeline.finish() if record]
+    if shards is not None:
+        shards.close(captured_data)
+
+    if reuse_cans:
+        for class_name in ["PASS", "FAIL"]:
+            for index in range(cans_per_frame):
+                delete_can(resident_can_name(class_name, index))
+
+    label_counts = {"PASS": 0, "FAIL": 0}
+    for d in captured_data:
+        for obj in d["objects"]:
+            label_counts[obj["label"]] += 1
+    log(f"\nCapture complete: {len(captured_data)} images, "
+        f"{label_counts['PASS']} PASS, {label_counts['FAIL']} FAIL")
+    log(capture.sync_summary())
+    log(timer.summary(time.time() - run_start))
 
     # Save metadata
+    write_annotations(output_dir, captured_data)
+
+    return captured_data
+
+
+def write_annotations(output_dir: Path, captured_data: list[dict]):
+    """Write annotations.json for the captured records."""
     metadata_path = output_dir / "annotations.json"
-    metadata = [
-        {
-            "filename": d["filepath"].name,
-            "label": d["label"],
-            "bbox": d["bbox"],
-        }
-        for d in captured_data
-    ]
+    metadata = [annotation_entry(d) for d in captured_data]
     with open(metadata_path, 'w') as f:
         json.dump(metadata, f, indent=2)
     log(f"Saved annotations to {metadata_path}")
 
-    return captured_data
+
+def annotation_entry(data: dict) -> dict:
+    """annotations.json entry for a captured image."""
+    entry = {
+        "filename": data["filepath"].name,
+        "objects": [{"label": obj["label"], "bbox": obj["bbox"]} for obj in data["objects"]],
+    }
+    if len(data["objects"]) == 1:
+        entry["label"] = data["label"]
+        entry["bbox"] = data["bbox"]
+    return entry
 
 
 # ============================================================================
 # Viam Upload with Bounding Boxes
 # ============================================================================
 
-async def upload_to_viam(captured_data: list[dict], config: dict):
-    """Upload captured images to Viam with bounding box annotations."""
+class FakeDataClient:
+    """
+    Local stand-in for the Viam data client (--fake-upload).
+
+    Implements the two calls the uploader uses, with a simulated network
+    latency, optional random failures, and a random indexing delay after
+    each upload during which bounding boxes are rejected (like Viam before
+    the file is indexed). Keeps what it received.
+    """
+
+    def __init__(self, latency: float = 0.05, failure_rate: float = 0.0,
+                 index_delay: tuple[float, float] = (0.2, 2.5)):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.index_delay = index_delay
+        self.files = {}  # file_id -> file_name
+        self.indexed_at = {}  # file_id -> time the file becomes indexed
+        self.boxes = []  # (file_id, label)
+
+    async def _call(self):
+        await asyncio.sleep(self.latency)
+        if random.random() < self.failure_rate:
+            raise ConnectionError("simulated failure")
+
+    async def file_upload(self, part_id, data, component_type, component_name, file_name,
+                          file_extension, tags):
+        await self._call()
+        file_id = uuid.uuid4().hex
+        self.files[file_id] = file_name
+        self.indexed_at[file_id] = time.time() + random.uniform(*self.index_delay)
+        return f"fake-org/fake-location/{file_id}"
+
+    async def add_bounding_box_to_image_by_id(self, binary_id, label, x_min_normalized,
+                                              x_max_normalized, y_min_normalized, y_max_normalized):
+        await self._call()
+        file_id = binary_id.file_id if hasattr(binary_id, "file_id") else binary_id["file_id"]
+        # Unknown ids were uploaded by an earlier (--resume) run and are indexed by now
+        if time.time() < self.indexed_at.get(file_id, 0):
+            raise LookupError(f"file {file_id} not found")
+        self.boxes.append((file_id, label))
+        return uuid.uuid4().hex
+
+
+async def with_retries(what: str, fn, *args, **kwargs):
+    """Await fn(*args, **kwargs), retrying failures with jittered exponential backoff."""
+    for attempt in range(UPLOAD_RETRIES + 1):
+        try:
+            return await fn(*args, **kwargs)
+        except Exception as e:
+            if attempt == UPLOAD_RETRIES:
+                raise
+            delay = random.uniform(0, UPLOAD_BACKOFF * 2 ** attempt)
+            log(f"    {what} failed ({e}), retry {attempt + 1}/{UPLOAD_RETRIES} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+
+class ViamUploader:
+    """
+    Uploads captured images and their bounding boxes to a Viam data client.
+
+    Up to `concurrency` images are in flight at once; each upload is retried
+    with jittered backoff. Bounding boxes can only be added once Viam has
+    indexed the file, so instead of sleeping after each upload the file goes
+    onto a deferred queue, where BBOX_WORKERS tasks attach its boxes,
+    retrying with exponential backoff until they are accepted. Uploads keep
+    going meanwhile. Works with the real data client or FakeDataClient.
+
+    Call start_workers() before upload() and finish() when done;
+    upload_all() does both.
+    """
+
+    def __init__(self, data_client, org_id: str, location_id: str, part_id: str,
+                 concurrency: int = UPLOAD_CONCURRENCY, manifest: Manifest | None = None,
+                 spool: ImageSpool | None = None):
+        self.data_client = data_client
+        self.manifest = manifest
+        self.spool = spool
+        self.org_id = org_id
+        self.location_id = location_id
+        self.part_id = part_id
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.bbox_queue = None
+        self.bbox_tasks = []
+        self.uploaded = 0
+        self.annotated = 0
+        self.failed = 0
+        self.skipped = 0
+        self.bbox_failed = 0
+        self.bbox_retries = 0
+        self.bbox_latency = [0] * (len(BBOX_HISTOGRAM) + 1)  # counts per bucket
+        self.start = None
+
+    def start_workers(self):
+        """Start the deferred bounding-box workers."""
+        self.bbox_queue = asyncio.Queue()
+        self.bbox_tasks = [asyncio.create_task(self._bbox_worker()) for _ in range(BBOX_WORKERS)]
+
+    async def finish(self):
+        """Wait for all queued bounding boxes, then stop the workers."""
+        await self.bbox_queue.join()
+        for task in self.bbox_tasks:
+            task.cancel()
+        await asyncio.gather(*self.bbox_tasks, return_exceptions=True)
+
+    def binary_id(self, file_id: str):
+        """BinaryID for an uploaded file (a plain dict without the SDK)."""
+        if VIAM_SDK_AVAILABLE:
+            return BinaryID(file_id=file_id, organization_id=self.org_id, location_id=self.location_id)
+        return {"file_id": file_id, "organization_id": self.org_id, "location_id": self.location_id}
+
+    async def upload(self, data: dict) -> bool:
+        """Upload one captured image and add its bounding boxes."""
+        if self.start is None:
+            self.start = time.time()
+
+        filepath = data["filepath"]
+        labels = sorted({obj["label"] for obj in data["objects"]})
+        image_data = self.spool.take(data) if self.spool is not None else None
+
+        # Skip work the manifest says is already done
+        if self.manifest is not None:
+            if filepath.name in self.manifest.annotated:
+                self.skipped += 1
+                return True
+            file_id = self.manifest.file_ids.get(filepath.name)
+            if file_id is not None:
+                self.skipped += 1
+                self.bbox_queue.put_nowait((data, file_id, time.time()))
+                return True
+
+        async with self.semaphore:
+            try:
+                # Read image data unless it is still in memory
+                if image_data is None:
+                    image_data = read_image(data)
+
+                # Upload image
+                file_id_full = await with_retries(
+                    f"Upload of {filepath.name}",
+                    self.data_client.file_upload,
+                    part_id=self.part_id,
+                    data=image_data,
+                    component_type="camera",
+                    component_name="training-capture",
+                    file_name=filepath.name,
+                    file_extension=".jpg",
+                    tags=labels + ["can-detection-training"],
+                )
+
+                # file_upload returns "org_id/location_id/file_id" - extract just the file_id
+                file_id = file_id_full.split("/")[-1] if "/" in file_id_full else file_id_full
+                if self.manifest is not None:
+                    self.manifest.record_uploaded(filepath.name, file_id)
+
+            except Exception as e:
+                log(f"  Failed to upload {filepath.name}: {e}")
+                self.failed += 1
+                return False
+
+        # Bounding boxes are attached once the file is indexed
+        self.bbox_queue.put_nowait((data, file_id, time.time()))
+
+        self.uploaded += 1
+        if self.uploaded % 5 == 0:
+            log(f"  Uploaded {self.uploaded} ({self.throughput():.2f} images/s)")
+        return True
+
+    async def _bbox_worker(self):
+        """Attach bounding boxes from the deferred queue."""
+        while True:
+            data, file_id, uploaded_at = await self.bbox_queue.get()
+            try:
+                await self._add_boxes(data, file_id, uploaded_at)
+            finally:
+                self.bbox_queue.task_done()
+
+    async def _add_boxes(self, data: dict, file_id: str, uploaded_at: float):
+        """Add an image's boxes, retrying with backoff until the file is indexed."""
+        filename = data["filepath"].name
+        binary_id = self.binary_id(file_id)
+        done = self.manifest.boxes.get(filename, set()) if self.manifest is not None else set()
+        remaining = [(index, obj) for index, obj in enumerate(data["objects"]) if index not in done]
+        delay = BBOX_INITIAL_DELAY
+
+        while remaining:
+            index, obj = remaining[0]
+            bbox = obj["bbox"]
+            try:
+                await self.data_client.add_bounding_box_to_image_by_id(
+                    binary_id=binary_id,
+                    label=obj["label"],
+                    x_min_normalized=bbox["x_min_normalized"],
+                    x_max_normalized=bbox["x_max_normalized"],
+                    y_min_normalized=bbox["y_min_normalized"],
+                    y_max_normalized=bbox["y_max_normalized"],
+                )
+                remaining.pop(0)
+                if self.manifest is not None:
+                    self.manifest.record_box(filename, index)
+            except Exception as e:
+                if time.time() - uploaded_at > BBOX_TIMEOUT:
+                    log(f"  Failed to add bounding boxes to {data['filepath'].name}: {e}")
+                    self.bbox_failed += 1
+                    return
+                self.bbox_retries += 1
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, BBOX_MAX_DELAY)
+
+        latency = time.time() - uploaded_at
+        bucket = sum(1 for edge in BBOX_HISTOGRAM if latency >= edge)
+        self.bbox_latency[bucket] += 1
+        self.annotated += 1
+        if self.manifest is not None:
+            self.manifest.record_annotated(filename)
+
+    async def upload_all(self, captured_data: list[dict]):
+        """Upload every captured image concurrently and attach its boxes."""
+        self.start_workers()
+        await asyncio.gather(*(self.upload(data) for data in captured_data))
+        await self.finish()
+
+    def bbox_summary(self) -> str:
+        """Bounding-box retry count and upload-to-annotated latency histogram."""
+        edges = ["0"] + [f"{edge:g}" for edge in BBOX_HISTOGRAM]
+        buckets = [f"{lo}-{hi}s: {count}" for lo, hi, count in
+                   zip(edges, edges[1:], self.bbox_latency)]
+        buckets.append(f">{edges[-1]}s: {self.bbox_latency[-1]}")
+        return (f"Bounding boxes: {self.annotated} images annotated, {self.bbox_failed} failed, "
+                f"{self.bbox_retries} retries; latency {', '.join(buckets)}")
+
+    def throughput(self) -> float:
+        """Uploaded images per second since the first upload started."""
+        elapsed = time.time() - self.start if self.start else 0.0
+        return self.uploaded / elapsed if elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        elapsed = time.time() - self.start if self.start else 0.0
+        return (f"Upload complete: {self.uploaded} images uploaded, {self.failed} failed, "
+                f"{self.skipped} already done in {elapsed:.1f}s ({self.throughput():.2f} images/s)")
+
+
+async def connect_data_client(config: dict, fake: bool = False):
+    """
+    Connect to Viam and return (client, data_client, ids).
+
+    client is None for the fake data client; ids has org_id, location_id,
+    part_id.
+    """
+    if fake:
+        log("Using local fake data client")
+        ids = {key: config.get(key) or f"fake-{key}" for key in ["org_id", "location_id", "part_id"]}
+        return None, FakeDataClient(), ids
 
     if not VIAM_SDK_AVAILABLE:
         raise RuntimeError("viam-sdk not installed. Install with: pip install viam-sdk")
@@ -644,74 +1920,92 @@ async def upload_to_viam(captured_data: list[dict], config: dict):
     )
 
     client = await ViamClient.create_from_dial_options(dial_options)
-    data_client = client.data_client
+    ids = {"org_id": org_id, "location_id": location_id, "part_id": part_id}
+    return client, client.data_client, ids
 
-    log("Connected. Uploading images with bounding boxes...")
 
-    uploaded = 0
-    failed = 0
+async def upload_to_viam(captured_data: list[dict], config: dict,
+                         concurrency: int = UPLOAD_CONCURRENCY, fake: bool = False,
+                         manifest: Manifest | None = None, spool: ImageSpool | None = None):
+    """Upload captured images to Viam with bounding box annotations."""
+    client, data_client, ids = await connect_data_client(config, fake)
 
-    for i, data in enumerate(captured_data):
-        filepath = data["filepath"]
-        label = data["label"]
-        bbox = data["bbox"]
+    log(f"Connected. Uploading images with bounding boxes ({concurrency} at a time)...")
 
-        try:
-            # Read image data
-            with open(filepath, 'rb') as f:
-                image_data = f.read()
-
-            # Upload image
-            file_id_full = await data_client.file_upload(
-                part_id=part_id,
-                data=image_data,
-                component_type="camera",
-                component_name="training-capture",
-                file_name=filepath.name,
-                file_extension=".jpg",
-                tags=[label, "can-detection-training"],
-            )
-
-            # file_upload returns "org_id/location_id/file_id" - extract just the file_id
-            file_id = file_id_full.split("/")[-1] if "/" in file_id_full else file_id_full
-            log(f"    Extracted file_id: {file_id}")
-
-            # Wait for file to be indexed before adding bounding box
-            await asyncio.sleep(2.0)
-
-            # Add bounding box annotation
-            binary_id = BinaryID(
-                file_id=file_id,
-                organization_id=org_id,
-                location_id=location_id,
-            )
-
-            await data_client.add_bounding_box_to_image_by_id(
-                binary_id=binary_id,
-                label=label,
-                x_min_normalized=bbox["x_min_normalized"],
-                x_max_normalized=bbox["x_max_normalized"],
-                y_min_normalized=bbox["y_min_normalized"],
-                y_max_normalized=bbox["y_max_normalized"],
-            )
-
-            uploaded += 1
-
-            if (i + 1) % 5 == 0:
-                log(f"  Uploaded {i + 1}/{len(captured_data)}")
+    uploader = ViamUploader(data_client, concurrency=concurrency, manifest=manifest, spool=spool, **ids)
+    await uploader.upload_all(captured_data)
 
-        except Exception as e:
-            log(f"  Failed to upload {filepath.name}: {e}")
-            failed += 1
+    report_upload(client, uploader)
+
+
+async def capture_and_upload(capture_kwargs: dict, config: dict,
+                             concurrency: int = UPLOAD_CONCURRENCY, fake: bool = False,
+                             manifest: Manifest | None = None, spool: ImageSpool | None = None) -> list[dict]:
+    """
+    Capture and upload at the same time (--stream).
+
+    capture_images() runs on a worker thread; each record is handed to the
+    event loop with call_soon_threadsafe as soon as its image is written,
+    and uploader tasks consume it from an asyncio queue immediately.
+
+    Returns:
+        The captured records, as capture_images() does
+    """
+    client, data_client, ids = await connect_data_client(config, fake)
+
+    log(f"Connected. Streaming uploads while capturing ({concurrency} at a time)...")
+
+    uploader = ViamUploader(data_client, concurrency=concurrency, manifest=manifest, spool=spool, **ids)
+    uploader.start_workers()
 
-    log(f"\nUpload complete: {uploaded} images uploaded, {failed} failed")
-    log("Next steps:")
-    log("  1. Go to app.viam.com → Data")
-    log("  2. Filter by tag 'can-detection-training'")
-    log("  3. Verify bounding boxes are correct")
-    log("  4. Create a dataset and train an object detection model")
+    loop = asyncio.get_running_loop()
+    records = asyncio.Queue()
 
-    client.close()
+    # Frames captured by an earlier run may still need uploading
+    if manifest is not None:
+        for record in manifest.records():
+            records.put_nowait(record)
+
+    def on_record(record: dict):
+        loop.call_soon_threadsafe(records.put_nowait, record)
+
+    async def consume():
+        while True:
+            record = await records.get()
+            if record is None:
+                return
+            await uploader.upload(record)
+
+    consumers = [asyncio.create_task(consume()) for _ in range(concurrency)]
+    start = time.time()
+    try:
+        captured_data = await asyncio.to_thread(capture_images, on_record=on_record, manifest=manifest,
+                                                spool=spool, **capture_kwargs)
+    finally:
+        # Wake every consumer once the queue drains
+        for _ in consumers:
+            records.put_nowait(None)
+        await asyncio.gather(*consumers)
+        await uploader.finish()
+
+    log(f"\nCapture + upload wall time: {time.time() - start:.1f}s")
+    report_upload(client, uploader)
+    return captured_data
+
+
+def report_upload(client, uploader: "ViamUploader"):
+    """Log the upload summary and close the client."""
+    log(f"\n{uploader.summary()}")
+    log(uploader.bbox_summary())
+    if uploader.spool is not None:
+        log(uploader.spool.summary())
+    if client is not None:
+        log("Next steps:")
+        log("  1. Go to app.viam.com → Data")
+        log("  2. Filter by tag 'can-detection-training'")
+        log("  3. Verify bounding boxes are correct")
+        log("  4. Create a dataset and train an object detection model")
+        client.close()
 
 
 # ============================================================================
@@ -727,29 +2021,123 @@ async def main():
                         help=f"Output directory (default: {OUTPUT_DIR})")
     parser.add_argument("--config", type=Path, default=CONFIG_FILE,
                         help=f"Path to config JSON file (default: {CONFIG_FILE})")
+    parser.add_argument("--gz-cli", action="store_true", default=USE_GZ_CLI,
+                        help="Spawn/delete cans via `gz service` subprocesses instead of in-process requests")
+    parser.add_argument("--reuse-cans", action="store_true",
+                        help="Move one resident can per class with set_pose instead of spawn/delete per sample")
+    parser.add_argument("--encode-workers", type=int, default=ENCODE_WORKERS,
+                        help=f"Threads encoding/writing frames during capture, 0 for inline (default: {ENCODE_WORKERS})")
+    parser.add_argument("--encode-queue", type=int, default=ENCODE_QUEUE_DEPTH,
+                        help=f"Maximum frames queued for encoding (default: {ENCODE_QUEUE_DEPTH})")
+    parser.add_argument("--upload-concurrency", type=int, default=UPLOAD_CONCURRENCY,
+                        help=f"Images uploaded in parallel (default: {UPLOAD_CONCURRENCY})")
+    parser.add_argument("--fake-upload", action="store_true",
+                        help="Upload to a local fake data client instead of Viam")
+    parser.add_argument("--stream", action="store_true",
+                        help="Upload images while capture is still running")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip work already recorded in the output directory's manifest.jsonl")
+    parser.add_argument("--no-local-copy", action="store_true",
+                        help="Upload from memory without writing JPEGs to the output directory")
+    parser.add_argument("--spool-mb", type=int, default=SPOOL_MB,
+                        help=f"Encoded images held in memory for upload, in MB (default: {SPOOL_MB})")
+    parser.add_argument("--shards", action="store_true",
+                        help="Write images into tar shards with sidecar annotations instead of loose files")
+    parser.add_argument("--shard-mb", type=int, default=SHARD_MB,
+                        help=f"Maximum shard size in MB (default: {SHARD_MB})")
+    parser.add_argument("--start-index", type=int, default=0,
+                        help="First image number, for runs that will be merged (default: 0)")
+    parser.add_argument("--cans-per-frame", type=int, default=1, metavar="K",
+                        help="Non-overlapping cans of random classes per frame (default: 1)")
+    parser.add_argument("--world", type=Path, default=WORLD_FILE,
+                        help=f"World file the running simulation was started with (default: {WORLD_FILE})")
+    parser.add_argument("--camera-sensor", default=CAMERA_SENSOR_NAME,
+                        help=f"Camera <sensor> name in the world file (default: {CAMERA_SENSOR_NAME})")
     args = parser.parse_args()
+    if args.world != WORLD_FILE or args.camera_sensor != CAMERA_SENSOR_NAME:
+        try:
+            use_world(args.world, args.camera_sensor, strict=True)
+        except (OSError, ValueError, AttributeError, ET.ParseError) as e:
+            parser.error(f"could not read --world {args.world}: {e}")
+    if args.no_local_copy and args.no_upload:
+        parser.error("--no-local-copy needs an upload; with --no-upload nothing would be kept")
+
+    global use_gz_cli
+    use_gz_cli = args.gz_cli
 
     log("=" * 50)
     log("Can Detection Training Data Capture")
     log("=" * 50)
+    log(f"World: {WORLD_NAME} ({WORLD_FILE or 'built-in values'})")
     log(f"Camera intrinsics:")
     log(f"  Distance to cans: {CAMERA_DISTANCE:.3f}m")
     log(f"  View width: {VIEW_WIDTH:.3f}m ({IMAGE_WIDTH}px)")
     log(f"  Pixels per meter: {PIXELS_PER_METER:.1f}")
     log(f"  Can radius in pixels: {CAN_RADIUS * PIXELS_PER_METER:.1f}px")
+    camera = get_camera_model()
+    if camera is not None:
+        x, y, z = camera.position
+        log(f"  Bounding boxes: projected, {CAMERA_SENSOR_NAME} at ({x:.3f}, {y:.3f}, {z:.3f})")
+    else:
+        log(f"  Bounding boxes: overhead formula (camera model unavailable)")
+    if JPEG_AVAILABLE:
+        log(f"JPEG encoder: {jpeg_encoder.encoder.name}")
     log("=" * 50)
 
     # Load credentials config
     config = load_config(args.config)
 
+    capture_kwargs = {
+        "output_dir": args.output,
+        "samples_per_class": args.samples,
+        "reuse_cans": args.reuse_cans,
+        "cans_per_frame": args.cans_per_frame,
+        "encode_workers": args.encode_workers,
+        "encode_queue": args.encode_queue,
+        "start_index": args.start_index,
+    }
+    if args.shards:
+        capture_kwargs["shards"] = ShardWriter(args.output, args.shard_mb * 1024 * 1024,
+                                               resume=args.resume)
+
+    # Progress log for --resume
+    manifest = Manifest(args.output, resume=args.resume)
+
+    # Hand encoded images to the uploader in memory. Streaming uploads free
+    # the spool as capture goes, so capture waits on them when it fills;
+    # otherwise everything is uploaded at the end, and images past the limit
+    # are read back from disk (from a temporary spill directory for a
+    # memory-only run).
+    spool = None
+    if not args.no_upload:
+        spill_dir = None
+        if args.no_local_copy and not args.stream:
+            spill_dir = Path(tempfile.mkdtemp(prefix="capture-spool-"))
+        spool = ImageSpool(args.spool_mb * 1024 * 1024, block=args.stream,
+                           local_copy=not args.no_local_copy, spill_dir=spill_dir)
+
+    if args.stream and not args.no_upload:
+        log(f"Capturing {args.samples} samples per class with streaming upload...")
+        await capture_and_upload(capture_kwargs, config, concurrency=args.upload_concurrency,
+                                 fake=args.fake_upload, manifest=manifest, spool=spool)
+        spool.close()
+        manifest.close()
+        return
+
     # Capture images
     log(f"Capturing {args.samples} samples per class...")
-    captured_data = capture_images(args.output, args.samples)
-
-    if not args.no_upload and captured_data:
-        await upload_to_viam(captured_data, config)
-    elif captured_data:
-        log("\nImages saved locally. To upload later, configure credentials and run again.")
+    try:
+        captured_data = capture_images(manifest=manifest, spool=spool, **capture_kwargs)
+
+        if not args.no_upload and captured_data:
+            await upload_to_viam(captured_data, config, concurrency=args.upload_concurrency,
+                                 fake=args.fake_upload, manifest=manifest, spool=spool)
+        elif captured_data:
+            log("\nImages saved locally. To upload later, configure credentials and run again with --resume.")
+    finally:
+        if spool is not None:
+            spool.close()
+    manifest.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+JPEG Encoding of Raw Camera Frames
+
+Gazebo image messages carry packed RGB (or RGBA) bytes. Encoding them with
+Pillow means copying the buffer into a PIL image first and copying the
+result out of a BytesIO afterwards. When simplejpeg is installed (a
+libjpeg-turbo build with SIMD, shipped as a self-contained wheel), frames
+are instead wrapped in a numpy array over a memoryview of the message bytes,
+without copying, and handed straight to the encoder.
+
+Backends are tried in PREFERRED order; set JPEG_ENCODER=pillow (or any other
+name in ENCODERS) to force one.
+
+Usage:
+    from jpeg_encoder import encode_rgb
+    jpeg = encode_rgb(msg.data, msg.width, msg.height, quality=90)
+
+Install the fast backend with:
+    pip install simplejpeg
+"""
+
+import io
+import os
+
+try:
+    import numpy as np
+    import simplejpeg
+    SIMPLEJPEG_AVAILABLE = True
+except ImportError:
+    SIMPLEJPEG_AVAILABLE = False
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+PREFERRED = ("simplejpeg", "pillow")
+CHROMA_SUBSAMPLING = "420"  # Pillow's default, so both backends give the same output size
+
+
+class PillowEncoder:
+    """Encode with Pillow (always available where the scripts run)."""
+
+    name = "pillow"
+    available = PIL_AVAILABLE
+
+    def encode(self, data, width: int, height: int, quality: int, channels: int = 3) -> bytes:
+        mode = "RGBA" if channels == 4 else "RGB"
+        img = Image.frombuffer(mode, (width, height), data, "raw", mode, 0, 1)
+        if channels == 4:
+            img = img.convert("RGB")
+        buffer = io.BytesIO()
+        img.save(buffer, format="JPEG", quality=quality)
+        return buffer.getvalue()
+
+
+class SimpleJpegEncoder:
+    """Encode with libjpeg-turbo through simplejpeg, reading the buffer in place."""
+
+    name = "simplejpeg"
+    available = SIMPLEJPEG_AVAILABLE
+
+    def encode(self, data, width: int, height: int, quality: int, channels: int = 3) -> bytes:
+        pixels = np.frombuffer(memoryview(data), dtype=np.uint8).reshape(height, width, channels)
+        return simplejpeg.encode_jpeg(pixels, quality=quality,
+                                      colorspace="RGBA" if channels == 4 else "RGB",
+                                      colorsubsampling=CHROMA_SUBSAMPLING)
+
+
+ENCODERS = {cls.name: cls for cls in (SimpleJpegEncoder, PillowEncoder)}
+
+
+def get_encoder(name: str | None = None):
+    """
+    An encoder by name, or the first available one in PREFERRED order.
+
+    Args:
+        name: backend name from ENCODERS; defaults to $JPEG_ENCODER if set
+
+    Returns:
+        Encoder instance, or None if no backend is installed
+    """
+    name = name or os.environ.get("JPEG_ENCODER")
+    if name:
+        if name not in ENCODERS:
+            raise ValueError(f"Unknown JPEG encoder {name!r} (choose from {', '.join(ENCODERS)})")
+        if not ENCODERS[name].available:
+            raise RuntimeError(f"JPEG encoder {name!r} is not installed")
+        return ENCODERS[name]()
+    for candidate in PREFERRED:
+        if ENCODERS[candidate].available:
+            return ENCODERS[candidate]()
+    return None
+
+
+encoder = get_encoder()
+
+
+def encode_rgb(data, width: int, height: int, quality: int = 90) -> bytes:
+    """
+    Encode a packed RGB or RGBA frame (any bytes-like object) as JPEG.
+
+    Raises:
+        ValueError: if the buffer size is neither RGB nor RGBA for the size
+    """
+    channels, extra = divmod(len(data), width * height)
+    if extra or channels not in (3, 4):
+        raise ValueError(f"Unknown image format: {len(data)} bytes for {width}x{height}")
+    return encoder.encode(data, width, height, quality, channels)
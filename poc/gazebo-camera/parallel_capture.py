@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Parallel Training Data Capture Across Several Gazebo Instances
+
+One gz-sim server renders one camera frame at a time, which caps
+capture_training_data.py at a few images per second. This coordinator runs
+N independent copies of the capture world, each in its own gz-transport
+partition (GZ_PARTITION), so their topics and services can't see each other,
+and gives each a slice of the sample budget:
+
+    instance i:  GZ_PARTITION=capture_<i>  gz sim -s -r <world>
+                 GZ_PARTITION=capture_<i>  capture_training_data.py --no-upload
+                     --world <world>
+                     --samples <share> --start-index <offset>
+                     --output <output>/instances/capture_<i>
+
+Image numbers are offset per instance, so when all workers finish their
+outputs are merged into <output> without renaming: loose JPEGs are moved up,
+shards (--shards) are moved into <output>/shards with the instance prefixed
+to their names, and a combined annotations.json, manifest.jsonl and shard
+index.json are written. The merged directory is a normal capture output, so
+the combined set is then uploaded once (or later with
+`capture_training_data.py --resume --output <output> --samples <samples>`
+plus the same capture options).
+
+The conveyor can_spawner.py started by entrypoint.sh runs in the default
+partition, so it doesn't put extra cans into these worlds.
+
+Usage (inside the container):
+
+    python3 /opt/parallel_capture.py --instances 4 --samples 200 --no-upload
+
+    # Capture options are passed through after --
+    python3 /opt/parallel_capture.py --instances 4 --samples 200 -- --reuse-cans --shards
+
+Options:
+  --instances N  gz-sim instances to run (default: half the CPU cores)
+  --samples N    Total images per class, split across instances (default: 50)
+  --output DIR   Merged output directory (default: ./training_data)
+  --world FILE   World to load in each instance
+                 (default: /opt/worlds/cylinder_inspection.sdf). Its <world
+                 name> gives the clock topic to wait for, and it is passed to
+                 every worker as --world (add --camera-sensor after -- if its
+                 camera isn't named inspection_cam)
+  --attach       Don't start gz-sim; use instances already running in
+                 partitions capture_0 .. capture_<N-1>
+  --no-upload    Merge locally without uploading to Viam
+  --fake-upload, --config FILE, --upload-concurrency N
+                 As for capture_training_data.py
+"""
+
+import argparse
+import asyncio
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+import capture_training_data as capture
+from capture_training_data import log
+
+# ============================================================================
+# Configuration
+# ============================================================================
+
+PARTITION_PREFIX = "capture_"
+DEFAULT_WORLD = Path("/opt/worlds/cylinder_inspection.sdf")
+CAPTURE_SCRIPT = Path(__file__).resolve().parent / "capture_training_data.py"
+INSTANCE_DIR = "instances"  # per-instance outputs, inside the merged output dir
+
+GZ_SIM_ARGS = ["-s", "-r"]  # server only, start unpaused
+STARTUP_TIMEOUT = 60.0  # seconds to wait for an instance's world clock to appear
+STARTUP_POLL = 1.0
+
+
+# ============================================================================
+# Instances
+# ============================================================================
+
+def partition_env(index: int) -> dict:
+    """Environment for processes that talk to instance `index`."""
+    return {**os.environ, "GZ_PARTITION": f"{PARTITION_PREFIX}{index}"}
+
+
+def split_samples(total: int, instances: int) -> list[tuple[int, int]]:
+    """Split a per-class sample budget into (start_index, samples) per instance."""
+    shares = []
+    start = 0
+    for i in range(instances):
+        count = total // instances + (1 if i < total % instances else 0)
+        shares.append((start, count))
+        start += count
+    return shares
+
+
+def start_world(index: int, world: Path) -> subprocess.Popen:
+    """Launch a headless gz-sim server in instance `index`'s partition."""
+    log(f"Starting gz-sim instance {index} ({PARTITION_PREFIX}{index})")
+    return subprocess.Popen(["gz", "sim", *GZ_SIM_ARGS, str(world)], env=partition_env(index),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_for_world(index: int, clock_topic: str, timeout: float = STARTUP_TIMEOUT) -> bool:
+    """Wait until instance `index` publishes the world clock."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            result = subprocess.run(["gz", "topic", "-l"], env=partition_env(index),
+                                    capture_output=True, text=True, timeout=10)
+        except subprocess.TimeoutExpired:
+            continue  # busy starting up; poll again until the deadline
+        if clock_topic in result.stdout.split():
+            return True
+        time.sleep(STARTUP_POLL)
+    return False
+
+
+def run_worker(index: int, start_index: int, samples: int, output_dir: Path, world: Path,
+               capture_args: list[str]) -> subprocess.Popen:
+    """Start capture_training_data.py against instance `index`."""
+    cmd = [
+        sys.executable, str(CAPTURE_SCRIPT), "--no-upload",
+        "--world", str(world),
+        "--samples", str(samples),
+        "--start-index", str(start_index),
+        "--output", str(output_dir),
+        *capture_args,
+    ]
+    return subprocess.Popen(cmd, env=partition_env(index), stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT, text=True)
+
+
+def relay_output(index: int, proc: subprocess.Popen):
+    """Echo a worker's output with its instance number."""
+    for line in proc.stdout:
+        print(f"[{index}] {line}", end="", flush=True)
+
+
+# ============================================================================
+# Merge
+# ============================================================================
+
+def merge_outputs(instance_dirs: list[Path], output_dir: Path) -> list[dict]:
+    """
+    Move every instance's captured images into output_dir.
+
+    Records come from each instance's manifest, so only images that were
+    actually written are merged. Shards keep their contents and get the
+    instance directory name as a prefix. The instance directories are
+    removed afterwards.
+
+    Returns:
+        The merged capture records
+    """
+    merged = []
+    for instance_dir in instance_dirs:
+        if not (instance_dir / capture.MANIFEST_NAME).exists():
+            log(f"  {instance_dir.name}: no manifest, skipping")
+            continue
+        manifest = capture.Manifest(instance_dir, resume=True)
+        manifest.close()
+        records = manifest.records()
+
+        moved_shards = {}
+        for record in records:
+            if "shard" in record:
+                source = record["shard"]["path"]
+                if source not in moved_shards:
+                    target = f"{capture.SHARD_DIR}/{instance_dir.name}-{Path(source).name}"
+                    (output_dir / capture.SHARD_DIR).mkdir(parents=True, exist_ok=True)
+                    shutil.move(instance_dir / source, output_dir / target)
+                    moved_shards[source] = target
+                record["shard"] = {**record["shard"], "path": moved_shards[source]}
+            else:
+                shutil.move(record["filepath"], output_dir / record["filepath"].name)
+            record["filepath"] = output_dir / record["filepath"].name
+
+        log(f"  {instance_dir.name}: {len(records)} images")
+        merged.extend(records)
+
+    # Everything left in the instance directories is now in the merged output
+    shutil.rmtree(output_dir / INSTANCE_DIR, ignore_errors=True)
+
+    merged.sort(key=lambda record: record["filepath"].name)
+    return merged
+
+
+def write_merged(output_dir: Path, records: list[dict]) -> "capture.Manifest":
+    """Write annotations, a fresh manifest and (if sharded) the shard index for records."""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    capture.write_annotations(output_dir, records)
+    if any("shard" in record for record in records):
+        capture.write_shard_index(output_dir, records)
+
+    manifest = capture.Manifest(output_dir)
+    for record in records:
+        manifest.record_captured(record)
+    return manifest
+
+
+# ============================================================================
+# Main Entry Point
+# ============================================================================
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description="Capture training data with several gz-sim instances in parallel",
+        epilog="Arguments after -- are passed to capture_training_data.py")
+    parser.add_argument("--instances", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="gz-sim instances to run (default: half the CPU cores)")
+    parser.add_argument("--samples", type=int, default=capture.SAMPLES_PER_CLASS,
+                        help=f"Total samples per class (default: {capture.SAMPLES_PER_CLASS})")
+    parser.add_argument("--output", type=Path, default=capture.OUTPUT_DIR,
+                        help=f"Merged output directory (default: {capture.OUTPUT_DIR})")
+    parser.add_argument("--world", type=Path, default=DEFAULT_WORLD,
+                        help=f"World file for each instance (default: {DEFAULT_WORLD})")
+    parser.add_argument("--attach", action="store_true",
+                        help=f"Use gz-sim instances already running in partitions {PARTITION_PREFIX}<i>")
+    parser.add_argument("--no-upload", action="store_true", help="Merge only, don't upload")
+    parser.add_argument("--config", type=Path, default=capture.CONFIG_FILE,
+                        help=f"Path to config JSON file (default: {capture.CONFIG_FILE})")
+    parser.add_argument("--fake-upload", action="store_true",
+                        help="Upload to a local fake data client instead of Viam")
+    parser.add_argument("--upload-concurrency", type=int, default=capture.UPLOAD_CONCURRENCY,
+                        help=f"Images uploaded in parallel (default: {capture.UPLOAD_CONCURRENCY})")
+    parser.add_argument("capture_args", nargs=argparse.REMAINDER,
+                        help="Options for capture_training_data.py, after --")
+    args = parser.parse_args()
+
+    capture_args = args.capture_args
+    if capture_args[:1] == ["--"]:
+        capture_args = capture_args[1:]
+
+    try:
+        world_name = capture.read_world_name(args.world)
+    except (OSError, ValueError, ET.ParseError) as e:
+        parser.error(f"could not read --world {args.world}: {e}")
+    clock_topic = f"/world/{world_name}/clock"
+
+    shares = [share for share in split_samples(args.samples, args.instances) if share[1] > 0]
+    instance_dirs = [args.output / INSTANCE_DIR / f"{PARTITION_PREFIX}{i}" for i in range(len(shares))]
+
+    log("=" * 50)
+    log(f"Parallel capture: {len(shares)} instances of {world_name}, {args.samples} samples per class")
+    log("=" * 50)
+
+    worlds = []
+    workers = []
+    start = time.time()
+    try:
+        if not args.attach:
+            worlds = [start_world(i, args.world) for i in range(len(shares))]
+        for i in range(len(shares)):
+            if not wait_for_world(i, clock_topic):
+                raise RuntimeError(f"Instance {i} did not publish {clock_topic} "
+                                   f"within {STARTUP_TIMEOUT:.0f}s")
+
+        for i, (start_index, samples) in enumerate(shares):
+            log(f"Instance {i}: {samples} per class from #{start_index}")
+            proc = run_worker(i, start_index, samples, instance_dirs[i], args.world, capture_args)
+            relay = threading.Thread(target=relay_output, args=(i, proc), daemon=True)
+            relay.start()
+            workers.append((proc, relay))
+
+        for i, (proc, relay) in enumerate(workers):
+            await asyncio.to_thread(proc.wait)
+            relay.join()
+            if proc.returncode != 0:
+                log(f"Instance {i} exited with code {proc.returncode}; merging what it captured")
+    finally:
+        for proc, _ in workers:
+            if proc.poll() is None:
+                proc.terminate()
+        for world in worlds:
+            world.terminate()
+        for world in worlds:
+            world.wait()
+
+    elapsed = time.time() - start
+    log(f"\nMerging {len(instance_dirs)} instance outputs into {args.output}")
+    records = merge_outputs(instance_dirs, args.output)
+    manifest = write_merged(args.output, records)
+    log(f"Captured {len(records)} images in {elapsed:.1f}s "
+        f"({len(records) / elapsed if elapsed > 0 else 0:.2f} images/s across {len(shares)} instances)")
+
+    if not args.no_upload and records:
+        config = capture.load_config(args.config)
+        await capture.upload_to_viam(records, config, concurrency=args.upload_concurrency,
+                                     fake=args.fake_upload, manifest=manifest)
+    elif records:
+        resume_cmd = ["capture_training_data.py", "--resume", "--output", str(args.output),
+                      "--world", str(args.world), "--samples", str(args.samples), *capture_args]
+        log(f"\nTo upload later: {shlex.join(resume_cmd)}")
+    manifest.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Scene Geometry from SDF Files
+
+Reads the numbers the capture script needs from the world and can model
+SDF files instead of hand-maintained constants:
+
+  - the camera sensor's composed world pose (model, link and sensor poses),
+    image size, horizontal FOV and image topic, from the world file
+  - the camera model's own position (where cans are placed "under" it)
+  - the can's visual extent (largest radius, top-to-bottom height over all
+    its cylinder visuals, e.g. body, lids and label band), from model.sdf
+
+Results are cached as JSON keyed by a hash of the files' contents, so later
+runs with unchanged files skip parsing and a changed world or model is
+picked up automatically.
+
+Usage:
+    geometry = load_scene_geometry(world_file, "inspection_cam", can_model_file)
+
+Run this file to print the geometry for the repo's world and can model:
+    python3 scene_geometry.py
+"""
+
+import hashlib
+import json
+import os
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from camera_projection import find_sensor, parse_pose
+
+CACHE_DIR = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "gazebo-camera"
+CACHE_VERSION = 2  # bump when the cached fields change
+
+_memo = {}
+
+
+def files_key(*paths: Path, extra: str = "") -> str:
+    """Hash of the files' contents (and extra), identifying a cache entry."""
+    digest = hashlib.sha256(f"{CACHE_VERSION}:{extra}".encode())
+    for path in paths:
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def parse_camera(world_file: Path, sensor_name: str) -> dict:
+    """Camera sensor pose and settings from a world file."""
+    sensor, world_from_sensor = find_sensor(world_file, sensor_name)
+    camera = sensor.find("camera")
+    topic = sensor.findtext("topic")
+
+    # The sensor's model, for the position cans are placed relative to
+    model_position = None
+    for model in ET.parse(world_file).getroot().iter("model"):
+        if any(s.get("name") == sensor_name for s in model.iter("sensor")):
+            pose = model.find("pose")
+            model_position = parse_pose(pose.text if pose is not None else None)[:3]
+            break
+
+    return {
+        "model_position": list(model_position),
+        "sensor_position": world_from_sensor[:3, 3].tolist(),
+        "world_from_sensor": world_from_sensor.tolist(),
+        "hfov": float(camera.findtext("horizontal_fov", "1.047")),
+        "width": int(camera.findtext("image/width", "320")),
+        "height": int(camera.findtext("image/height", "240")),
+        "topic": "/" + topic.strip().lstrip("/") if topic else None,
+    }
+
+
+def parse_can(model_file: Path) -> dict:
+    """Radius and height spanned by a can model's cylinder visuals."""
+    radius = 0.0
+    bottom = top = None
+    for visual in ET.parse(model_file).getroot().iter("visual"):
+        cylinder = visual.find("geometry/cylinder")
+        if cylinder is None:
+            continue
+        pose = visual.find("pose")
+        z = parse_pose(pose.text if pose is not None else None)[2]
+        half = float(cylinder.findtext("length", "0")) / 2
+        radius = max(radius, float(cylinder.findtext("radius", "0")))
+        bottom = z - half if bottom is None else min(bottom, z - half)
+        top = z + half if top is None else max(top, z + half)
+    if bottom is None:
+        raise ValueError(f"No cylinder visuals in {model_file}")
+    return {"radius": radius, "height": top - bottom}
+
+
+def load_scene_geometry(world_file: Path, sensor_name: str, can_model_file: Path) -> dict:
+    """
+    Camera and can geometry for a world, cached by file contents.
+
+    Returns:
+        dict with camera (see parse_camera) and can (radius, height)
+    """
+    key = files_key(world_file, can_model_file, extra=sensor_name)
+    if key in _memo:
+        return _memo[key]
+
+    cache_file = CACHE_DIR / f"scene-{key}.json"
+    try:
+        with open(cache_file) as f:
+            geometry = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        geometry = {
+            "camera": parse_camera(world_file, sensor_name),
+            "can": parse_can(can_model_file),
+        }
+        try:
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            with open(cache_file, 'w') as f:
+                json.dump(geometry, f, indent=2)
+        except OSError:
+            pass  # read-only home; just parse again next time
+
+    _memo[key] = geometry
+    return geometry
+
+
+if __name__ == "__main__":
+    here = Path(__file__).parent
+    print(json.dumps(load_scene_geometry(here / "worlds" / "cylinder_inspection.sdf", "inspection_cam",
+                                         here / "models" / "can_good" / "model.sdf"), indent=2))
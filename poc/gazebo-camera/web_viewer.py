@@ -5,16 +5,30 @@ Serves MJPEG streams for camera topics.
 
 To add a camera, just add an entry to the CAMERAS dict below.
 The HTML and subscriptions are generated dynamically.
+
+Frames are only JPEG-encoded while someone is watching (see camera_stream.py).
+Per-camera CPU use is logged every few seconds and served at /stats.
+
+Streams and snapshots take optional width, quality and fps query parameters,
+e.g. /stream/overview?width=320&quality=50&fps=10. A stream whose
+connection can't keep up is stepped down to a smaller or lower-quality
+variant until it catches up.
+
+Usage:
+    python3 web_viewer.py          # threaded Flask server
+    python3 web_viewer.py --asgi   # single asyncio event loop (needs uvicorn),
+                                   # for many concurrent viewers
 """
 
-import io
+import argparse
 import time
-import threading
-from flask import Flask, Response
+
+from flask import Flask, Response, jsonify, request
 
 from gz.transport13 import Node
 from gz.msgs10.image_pb2 import Image as GzImage
-from PIL import Image
+
+from camera_stream import CameraStream, StatsReporter, StreamClient
 
 app = Flask(__name__)
 
@@ -35,37 +49,35 @@ CAMERAS = {
     },
 }
 
+JPEG_QUALITY = 80
+
 # Runtime state for each camera (populated at startup)
 camera_state = {}
+stats_reporter = None
 
 
 def make_callback(camera_key):
     """Create a callback for a camera topic."""
-    def callback(msg: GzImage):
-        try:
-            img = Image.frombytes("RGB", (msg.width, msg.height), msg.data)
-            buffer = io.BytesIO()
-            img.save(buffer, format="JPEG", quality=80)
-            jpeg_bytes = buffer.getvalue()
-
-            with camera_state[camera_key]["lock"]:
-                camera_state[camera_key]["frame"] = jpeg_bytes
-        except Exception as e:
-            print(f"Error processing {camera_key} frame: {e}")
-    return callback
-
+    return camera_state[camera_key].on_image
 
-def generate_stream(camera_key):
-    """Generator that yields MJPEG frames."""
-    while True:
-        with camera_state[camera_key]["lock"]:
-            frame = camera_state[camera_key]["frame"]
 
-        if frame is not None:
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+def generate_stream(camera_key, client):
+    """Generator that yields MJPEG frames in the client's current variant."""
+    stream = camera_state[camera_key]
+    seq = 0
+    with stream.viewer():
+        while True:
+            time.sleep(client.next_delay())
+            # Blocks until there is a frame this client hasn't sent yet
+            seq, frame = stream.next_jpeg(seq, client.variant)
 
-        time.sleep(0.033)  # ~30fps
+            if frame is not None:
+                # The server resumes the generator once the frame is written,
+                # so this is how long the client's socket took to take it
+                start = time.monotonic()
+                yield (b'--frame\r\n'
+                       b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+                client.sent(time.monotonic() - start)
 
 
 def generate_html():
@@ -168,8 +180,9 @@ def index():
 def stream(camera):
     if camera not in CAMERAS:
         return "Camera not found", 404
+    client = StreamClient.from_query(camera_state[camera], request.args)
     return Response(
-        generate_stream(camera),
+        generate_stream(camera, client),
         mimetype='multipart/x-mixed-replace; boundary=frame'
     )
 
@@ -178,27 +191,60 @@ def stream(camera):
 def snapshot(camera):
     if camera not in CAMERAS:
         return "Camera not found", 404
-    with camera_state[camera]["lock"]:
-        frame = camera_state[camera]["frame"]
+    stream = camera_state[camera]
+    frame = stream.latest_jpeg(StreamClient.from_query(stream, request.args).variant)
     if frame is None:
         return "No frame available", 503
     return Response(frame, mimetype='image/jpeg')
 
 
+@app.route('/stats')
+def stats():
+    """Average CPU per camera, with and without viewers."""
+    return jsonify(stats_reporter.summary())
+
+
+def serve_asgi(port: int):
+    """Serve the same routes from one asyncio event loop with uvicorn."""
+    import uvicorn
+    from asgi_stream import make_app
+
+    asgi_app = make_app(
+        generate_html(),
+        streams={f"/stream/{key}": stream for key, stream in camera_state.items()},
+        snapshots={f"/snapshot/{key}": stream for key, stream in camera_state.items()},
+        stats_reporter=stats_reporter,
+    )
+    uvicorn.run(asgi_app, host='0.0.0.0', port=port, log_level="warning")
+
+
 def main():
+    global stats_reporter
+    parser = argparse.ArgumentParser(description="Serve Gazebo camera topics as MJPEG streams")
+    parser.add_argument("--asgi", action="store_true",
+                        help="Serve from an asyncio event loop (uvicorn) instead of threaded Flask")
+    parser.add_argument("--port", type=int, default=8081, help="HTTP port (default: 8081)")
+    args = parser.parse_args()
+
     node = Node()
 
     print("Subscribing to camera topics...")
 
     for key, cam in CAMERAS.items():
-        camera_state[key] = {"frame": None, "lock": threading.Lock()}
+        camera_state[key] = CameraStream(key, quality=JPEG_QUALITY)
         success = node.subscribe(GzImage, cam["topic"], make_callback(key))
         status = "OK" if success else "FAILED"
         print(f"  {cam['topic']}: {status}")
 
-    print(f"\nStarting web server on http://0.0.0.0:8081")
+    stats_reporter = StatsReporter(camera_state)
+    stats_reporter.start()
+
+    print(f"\nStarting {'ASGI' if args.asgi else 'web'} server on http://0.0.0.0:{args.port}")
     print("Open this URL in your browser to view the cameras.")
-    app.run(host='0.0.0.0', port=8081, threaded=True)
+    if args.asgi:
+        serve_asgi(args.port)
+    else:
+        app.run(host='0.0.0.0', port=args.port, threaded=True)
 
 
 if __name__ == "__main__":
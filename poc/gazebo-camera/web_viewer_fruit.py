@@ -2,27 +2,36 @@
 """
 Web viewer for Fruit Inspection simulation.
 Serves MJPEG stream from the overhead inspection camera.
+
+Frames are only JPEG-encoded while someone is watching (see camera_stream.py).
+CPU use is logged every few seconds and served at /stats.
+
+/stream and /snapshot take optional width, quality and fps query parameters,
+e.g. /stream?width=320&quality=50&fps=10. A stream whose connection can't
+keep up is stepped down to a smaller or lower-quality variant until it
+catches up.
+
+Usage:
+    python3 web_viewer_fruit.py          # threaded Flask server
+    python3 web_viewer_fruit.py --asgi   # single asyncio event loop (needs uvicorn)
 """
 
-import io
+import argparse
 import time
-import threading
-from flask import Flask, Response, render_template_string
+
+from flask import Flask, Response, jsonify, render_template_string, request
 
 from gz.transport13 import Node
 from gz.msgs10.image_pb2 import Image as GzImage
-from PIL import Image
+
+from camera_stream import CameraStream, StatsReporter, StreamClient
 
 app = Flask(__name__)
 
 # Camera stream
-camera = {
-    "topic": "/inspection_camera",
-    "frame": None,
-    "lock": threading.Lock(),
-    "width": 640,
-    "height": 480
-}
+CAMERA_TOPIC = "/inspection_camera"
+camera = CameraStream("inspection", quality=85)
+stats_reporter = StatsReporter({"inspection": camera})
 
 HTML_PAGE = """
 <!DOCTYPE html>
@@ -184,35 +193,26 @@ HTML_PAGE = """
 
 
 def camera_callback(msg: GzImage):
-    """Process incoming camera images from Gazebo."""
-    try:
-        # Convert raw RGB to PIL Image
-        img = Image.frombytes("RGB", (msg.width, msg.height), msg.data)
-
-        # Convert to JPEG
-        buffer = io.BytesIO()
-        img.save(buffer, format="JPEG", quality=85)
-        jpeg_bytes = buffer.getvalue()
-
-        with camera["lock"]:
-            camera["frame"] = jpeg_bytes
-            camera["width"] = msg.width
-            camera["height"] = msg.height
-    except Exception as e:
-        print(f"Error processing frame: {e}")
+    """Store incoming camera images from Gazebo (encoded when viewed)."""
+    camera.on_image(msg)
 
 
-def generate_stream():
-    """Generator that yields MJPEG frames."""
-    while True:
-        with camera["lock"]:
-            frame = camera["frame"]
+def generate_stream(client):
+    """Generator that yields MJPEG frames in the client's current variant."""
+    seq = 0
+    with camera.viewer():
+        while True:
+            time.sleep(client.next_delay())
+            # Blocks until there is a frame this client hasn't sent yet
+            seq, frame = camera.next_jpeg(seq, client.variant)
 
-        if frame is not None:
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
-
-        time.sleep(0.033)  # ~30fps
+            if frame is not None:
+                # The server resumes the generator once the frame is written,
+                # so this is how long the client's socket took to take it
+                start = time.monotonic()
+                yield (b'--frame\r\n'
+                       b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+                client.sent(time.monotonic() - start)
 
 
 @app.route('/')
@@ -223,29 +223,54 @@ def index():
 @app.route('/stream')
 def stream():
     return Response(
-        generate_stream(),
+        generate_stream(StreamClient.from_query(camera, request.args)),
         mimetype='multipart/x-mixed-replace; boundary=frame'
     )
 
 
 @app.route('/snapshot')
 def snapshot():
-    with camera["lock"]:
-        frame = camera["frame"]
+    frame = camera.latest_jpeg(StreamClient.from_query(camera, request.args).variant)
     if frame is None:
         return "No frame available", 503
     return Response(frame, mimetype='image/jpeg')
 
 
+@app.route('/stats')
+def stats():
+    """Average CPU with and without viewers."""
+    return jsonify(stats_reporter.summary())
+
+
+def serve_asgi(port: int):
+    """Serve the same routes from one asyncio event loop with uvicorn."""
+    import uvicorn
+    from asgi_stream import make_app
+
+    asgi_app = make_app(HTML_PAGE, streams={"/stream": camera}, snapshots={"/snapshot": camera},
+                        stats_reporter=stats_reporter)
+    uvicorn.run(asgi_app, host='0.0.0.0', port=port, log_level="warning")
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Serve the inspection camera as an MJPEG stream")
+    parser.add_argument("--asgi", action="store_true",
+                        help="Serve from an asyncio event loop (uvicorn) instead of threaded Flask")
+    parser.add_argument("--port", type=int, default=8080, help="HTTP port (default: 8080)")
+    args = parser.parse_args()
+
     node = Node()
 
     print("Subscribing to inspection camera...")
-    success = node.subscribe(GzImage, "/inspection_camera", camera_callback)
-    print(f"  /inspection_camera: {'OK' if success else 'FAILED'}")
+    success = node.subscribe(GzImage, CAMERA_TOPIC, camera_callback)
+    print(f"  {CAMERA_TOPIC}: {'OK' if success else 'FAILED'}")
+    stats_reporter.start()
 
-    print(f"\nStarting web server on http://0.0.0.0:8080")
-    app.run(host='0.0.0.0', port=8080, threaded=True)
+    print(f"\nStarting {'ASGI' if args.asgi else 'web'} server on http://0.0.0.0:{args.port}")
+    if args.asgi:
+        serve_asgi(args.port)
+    else:
+        app.run(host='0.0.0.0', port=args.port, threaded=True)
 
 
 if __name__ == "__main__":